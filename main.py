@@ -1,10 +1,38 @@
+import argparse
+import cProfile
 import os
-import json
-import shutil
-from src.init_config import create_adm_config_if_not_exists, create_readme_if_not_exists
+from src.init_config import (
+    create_adm_config_if_not_exists,
+    create_readme_if_not_exists,
+    get_db_path,
+    get_sidecar_path,
+    load_config,
+)
+from src.diving_fish_prober import get_client, stream_player_scores
+from src.diving_fish_to_aquadx import save_player_scores
+from src.aquadx_to_diving_fish import aquadx_data_upload, get_music_catalog
+from src.aquadx_get_user import get_user
+from src.aqua_db import close_connections, get_connection
+from src.db_index import drop_index, prepare_index
+from src.instrumentation import print_summary
+from src.rating import compute_ratings, write_ratings
+from src.score_diff import (
+    DELETE,
+    INSERT,
+    UNCHANGED,
+    UPDATE,
+    diff_download,
+    diff_upload,
+    summarize,
+)
+from src.snapshot import (
+    list_snapshots,
+    load_snapshot,
+    next_snapshot_name,
+    save_snapshot,
+)
+from src.snapshot_store import SNAPSHOT_STORE_DIR, SnapshotStore
 
-CONFIG_FILE = "adm_config.json"
-README_FILE = "README.txt"
 VERSION = "1.0.0"
 
 
@@ -13,71 +41,53 @@ def wait_for_exit():
 
 
 def check_files():
+    """检查和创建配置文件，成功时返回读取到的配置"""
     create_readme_if_not_exists()
     if create_adm_config_if_not_exists():
-        return False
+        return None
 
-    with open(CONFIG_FILE, "r", encoding="utf-8") as f:
-        config = json.load(f)
-    db_path = os.path.join(config["aqua_path"], "data", "db.sqlite")
+    config = load_config()
+    db_path = get_db_path(config)
     if not os.path.exists(db_path):
         print(f"数据库文件 {db_path} 不存在，请检查 aqua_path 配置。")
-        wait_for_exit()
-        return False
-    return True
-
-
-print(f"当前版本: {VERSION}")
-
-
-# 检查和创建配置文件后导入其他模块
-if not check_files():
-    wait_for_exit()
-    exit()
-
-from src.diving_fish_prober import ProberAPIClient, get_player_scores
-from src.diving_fish_to_aquadx import save_player_scores
-from src.aquadx_to_diving_fish import aquadx_data_upload
-from src.aquadx_get_user import get_user
+        return None
+    return config
 
 
-def save_game(config):
-    db_path = os.path.join(config["aqua_path"], "data", "db.sqlite")
-    save_files = [
-        f for f in os.listdir() if f.startswith("save") and f.endswith(".sqlite")
-    ]
-
-    # 找到第一个可用的存档位
-    save_indices = sorted(int(f[4:-7]) for f in save_files)
-    save_index = 1
-    for index in save_indices:
-        if save_index < index:
-            break
-        save_index += 1
+def save_game(config, user_id):
+    compression = config.get("snapshot_compression") or None
+    user_only = input("是否只保存当前玩家的数据？(y/n): ").lower() == "y"
+    snapshot_user_id = user_id if user_only else None
 
-    save_file_name = f"save{save_index}.sqlite"
+    if config.get("snapshot_dedup"):
+        recipe = SnapshotStore().save(config, snapshot_user_id)
+        print(
+            f"存档已保存为 {recipe['name']}，"
+            f"新增 {recipe['new_chunks']}/{len(recipe['chunks'])} 个块"
+        )
+        return
 
-    shutil.copy(db_path, save_file_name)
+    save_file_name = next_snapshot_name(snapshot_user_id, compression)
+    save_snapshot(config, save_file_name, snapshot_user_id, compression)
     print(f"存档已保存为 {save_file_name}")
 
 
 def load_game(config):
-    db_path = os.path.join(config["aqua_path"], "data", "db.sqlite")
-    save_files = [
-        f for f in os.listdir() if f.startswith("save") and f.endswith(".sqlite")
+    snapshots = [
+        (save_file, users, load_snapshot) for save_file, users in list_snapshots()
     ]
+    if os.path.isdir(get_sidecar_path(SNAPSHOT_STORE_DIR)):
+        store = SnapshotStore()
+        snapshots += [
+            (recipe["name"], recipe["users"], store.restore) for recipe in store.list()
+        ]
 
-    if not save_files:
+    if not snapshots:
         print("没有找到任何存档文件。")
         return
 
     print("可用的存档文件：")
-    for i, save_file in enumerate(save_files, 1):
-        # 临时复制存档文件以读取用户信息
-        temp_db_path = os.path.join(config["aqua_path"], "data", f"temp_{save_file}")
-        shutil.copy(save_file, temp_db_path)
-
-        users = get_user(temp_db_path)
+    for i, (save_file, users, _) in enumerate(snapshots, 1):
         if users:
             user_info = "\n".join(
                 [
@@ -90,43 +100,60 @@ def load_game(config):
 
         print(f"{i}. {save_file} - {user_info}")
 
-        # 删除临时文件
-        os.remove(temp_db_path)
-
     choice = int(input("请选择要读取的存档编号: "))
-    if choice < 1 or choice > len(save_files):
+    if choice < 1 or choice > len(snapshots):
         print("无效的选择。")
         return
 
-    selected_save_file = save_files[choice - 1]
+    selected_save_file, _, restore = snapshots[choice - 1]
 
-    shutil.copy(selected_save_file, db_path)
+    try:
+        restore(config, selected_save_file)
+    except RuntimeError as e:
+        print(f"读取存档失败: {e}")
+        return
     print(f"已加载存档 {selected_save_file}")
 
 
-def main():
-    with open(CONFIG_FILE, "r", encoding="utf-8") as f:
-        config = json.load(f)
-
-    if not config["username"] or not config["password"] or not config["aqua_path"]:
-        print("请先填写config.json文件中的配置信息。")
-        wait_for_exit()
+def update_rating(config, user_id):
+    conn = get_connection(config)
+    ratings = compute_ratings(conn, get_music_catalog(config), user_id)
+    if user_id not in ratings:
+        print("没有可用于计算 rating 的成绩。")
         return
+    write_ratings(conn, ratings)
+    rating = ratings[user_id]
+    print(
+        f"rating 已更新为 {rating['rating']} (b35: {rating['b35']}, b15: {rating['b15']})"
+    )
 
-    client = ProberAPIClient()
-    client.username = config["username"]
-    client.password = config["password"]
+
+def login(config):
     try:
-        client.login()
+        get_client(config).login()
     except Exception as e:
         print(
             f"diving-fish 登录凭证验证失败，请检查 config.json 中的信息是否正确输入: {e}"
         )
+        return False
+    print("验证 diving-fish 账号信息成功。")
+    return True
+
+
+def main():
+    print(f"当前版本: {VERSION}")
+
+    config = check_files()
+    if config is None:
+        wait_for_exit()
+        return
+
+    if not config["username"] or not config["password"] or not config["aqua_path"]:
+        print("请先填写config.json文件中的配置信息。")
         wait_for_exit()
         return
-    print("验证 diving-fish 账号信息成功。")
 
-    users = get_user()
+    users = get_user(get_db_path(config), config)
     if not users:
         print(
             "没有查询到 AquaDX 数据库中的玩家信息。请先进行至少一局游戏并成功保存记录。"
@@ -157,41 +184,81 @@ def main():
         return
 
     if choice in ["1", "2"]:
+        # 只有需要访问 diving-fish 的操作才登录
+        if not login(config):
+            wait_for_exit()
+            return
+
         overwrite_choice = input("是否覆盖已有成绩(否则择优保存)(y/n): ")
         overwrite = overwrite_choice.lower() == "y"
 
         if overwrite:
+            preview = diff_download if choice == "1" else diff_upload
+            summary = summarize(preview(config, user_id, overwrite=True))
+            print(
+                f"覆盖后将新增 {summary[INSERT]}、更新 {summary[UPDATE]}、"
+                f"删除 {summary[DELETE]} 个谱面，{summary[UNCHANGED]} 个谱面不变。"
+                "运行 python -m src.score_diff 可导出每个谱面的改动。"
+            )
             confirm_choice = input("覆盖成绩会清除现有成绩，是否确定？(y/n): ")
             if confirm_choice.lower() != "y":
                 print("操作已取消。")
                 wait_for_exit()
                 return
+        temporary_index = prepare_index(config, get_connection(config))
     else:
         overwrite = False
+        temporary_index = False
 
-    if choice == "1":
-        # 同步 diving-fish 玩家成绩至 AquaDX
-        scores = get_player_scores()
-        save_player_scores(scores, user_id, overwrite=overwrite)
-        print("同步 diving-fish 玩家成绩至 AquaDX 成功")
-    elif choice == "2":
-        # 上传 AquaDX 数据到 diving-fish
-        response = aquadx_data_upload(user_id=user_id, overwrite=overwrite)
-        if response.get("message") == "更新成功":
-            print("上传 AquaDX 数据到 diving-fish 成功")
-        else:
-            print(
-                f"上传出现异常，状态码: {response.get('status_code')}, 信息: {response.get('message')}"
-            )
-    elif choice == "3":
-        # 保存存档
-        save_game(config)
-    elif choice == "4":
-        # 读取存档
-        load_game(config)
-
+    # 同步出错或被中断时也要删除临时索引
+    try:
+        if choice == "1":
+            # 同步 diving-fish 玩家成绩至 AquaDX
+            scores = stream_player_scores(config)
+            save_player_scores(config, scores, user_id, overwrite=overwrite)
+            print("同步 diving-fish 玩家成绩至 AquaDX 成功")
+            if input("是否按同步后的成绩重新计算 rating？(y/n): ").lower() == "y":
+                update_rating(config, user_id)
+        elif choice == "2":
+            # 上传 AquaDX 数据到 diving-fish
+            response = aquadx_data_upload(config, user_id=user_id, overwrite=overwrite)
+            if response.get("message") == "更新成功":
+                print("上传 AquaDX 数据到 diving-fish 成功")
+            elif response.get("status") == "unchanged":
+                print("没有需要上传的成绩")
+            else:
+                print(
+                    f"上传出现异常，状态码: {response.get('status_code')}, 信息: {response.get('message')}"
+                )
+        elif choice == "3":
+            # 保存存档
+            save_game(config, user_id)
+        elif choice == "4":
+            # 读取存档
+            load_game(config)
+    finally:
+        if temporary_index:
+            drop_index(get_connection(config))
+
+    print_summary()
     wait_for_exit()
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="AquaDX-DB-Manager")
+    parser.add_argument(
+        "--profile", metavar="PATH", help="使用 cProfile 分析本次运行并写入该文件"
+    )
+    args = parser.parse_args()
+
+    profiler = cProfile.Profile() if args.profile else None
+    try:
+        if profiler is not None:
+            profiler.runcall(main)
+        else:
+            main()
+    finally:
+        close_connections()
+        if profiler is not None:
+            profiler.dump_stats(args.profile)
+            print(f"性能分析结果已写入 {args.profile}")
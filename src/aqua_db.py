@@ -0,0 +1,93 @@
+import pathlib
+import sqlite3
+import threading
+from .init_config import get_db_path
+from .instrumentation import count
+
+DEFAULT_BUSY_TIMEOUT = 5000
+DEFAULT_CACHE_SIZE = -16000
+# sqlite3 按 SQL 文本缓存预编译语句，各模块使用固定的 SQL 常量即可复用
+CACHED_STATEMENTS = 256
+
+_local = threading.local()
+
+
+class CountingConnection(sqlite3.Connection):
+    """统计通过连接执行的 SQL 语句数与 executemany 影响的行数"""
+
+    def execute(self, sql, parameters=()):
+        count("sql.statements")
+        return super().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        cursor = super().executemany(sql, seq_of_parameters)
+        count("sql.statements")
+        count("sql.rows_written", max(cursor.rowcount, 0))
+        return cursor
+
+
+def apply_pragmas(conn, config=None, read_only=False):
+    """按配置设置连接的 pragma
+
+    Args:
+        conn (sqlite3.Connection): 数据库连接
+        config (dict, optional): adm_config.json 中的配置. Defaults to None.
+        read_only (bool, optional): 只读连接不修改日志模式. Defaults to False.
+    """
+    config = config or {}
+    busy_timeout = int(config.get("db_busy_timeout", DEFAULT_BUSY_TIMEOUT))
+    cache_size = int(config.get("db_cache_size", DEFAULT_CACHE_SIZE))
+    conn.execute(f"PRAGMA busy_timeout = {busy_timeout}")
+    conn.execute(f"PRAGMA cache_size = {cache_size}")
+
+    # WAL 会持久地改变数据库文件的日志模式，因此需要显式开启
+    if config.get("db_wal", False) and not read_only:
+        conn.execute("PRAGMA journal_mode = WAL")
+
+    synchronous = config.get("db_synchronous")
+    if synchronous:
+        if str(synchronous).upper() not in ("OFF", "NORMAL", "FULL", "EXTRA"):
+            raise ValueError(f"无效的 db_synchronous 配置: {synchronous}")
+        conn.execute(f"PRAGMA synchronous = {str(synchronous).upper()}")
+
+
+def connect(db_path, config=None, read_only=False):
+    """打开一个新的数据库连接并设置 pragma，调用方负责关闭
+
+    read_only 为 True 时通过 mode=ro 的 URI 原地只读打开，不会创建或修改文件。
+    """
+    busy_timeout = int((config or {}).get("db_busy_timeout", DEFAULT_BUSY_TIMEOUT))
+    if read_only:
+        database = f"{pathlib.Path(db_path).absolute().as_uri()}?mode=ro"
+    else:
+        database = db_path
+    conn = sqlite3.connect(
+        database,
+        timeout=busy_timeout / 1000,
+        cached_statements=CACHED_STATEMENTS,
+        uri=read_only,
+        factory=CountingConnection,
+    )
+    apply_pragmas(conn, config, read_only)
+    return conn
+
+
+def get_connection(config):
+    """返回当前线程中 Aqua 数据库的共享连接，首次调用时创建"""
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+
+    db_path = get_db_path(config)
+    conn = connections.get(db_path)
+    if conn is None:
+        conn = connections[db_path] = connect(db_path, config)
+    return conn
+
+
+def close_connections():
+    """关闭当前线程中的所有共享连接"""
+    connections = getattr(_local, "connections", None) or {}
+    for conn in connections.values():
+        conn.close()
+    connections.clear()
@@ -1,25 +1,21 @@
-import json
-import sqlite3
+from .aqua_db import connect
 
-with open("adm_config.json", "r") as f:
-    config = json.load(f)
+SELECT_USERS_SQL = "SELECT id, user_name, player_rating FROM maimai2_user_detail"
 
-default_aqua_path = config["aqua_path"]
-default_db_path = f"{default_aqua_path}/data/db.sqlite"
 
-
-def get_user(db_path=default_db_path):
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-
-    cursor.execute("SELECT id, user_name, player_rating FROM maimai2_user_detail")
-    rows = cursor.fetchall()
+def query_users(conn):
+    rows = conn.execute(SELECT_USERS_SQL).fetchall()
 
     users = [
         {"id": row[0], "user_name": row[1], "player_rating": row[2]} for row in rows
     ]
 
-    cursor.close()
-    conn.close()
-
     return users
+
+
+def get_user(db_path, config=None, read_only=False):
+    conn = connect(db_path, config, read_only)
+    try:
+        return query_users(conn)
+    finally:
+        conn.close()
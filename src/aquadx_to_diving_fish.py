@@ -1,165 +1,161 @@
-import json
-import sqlite3
+import threading
 from tqdm import tqdm
-from .diving_fish_prober import ProberAPIClient, get_music_data
-
-with open("adm_config.json", "r") as f:
-    config = json.load(f)
-
-aqua_path = config["aqua_path"]
-db_path = f"{aqua_path}/data/db.sqlite"
-
-diving_fish_music_details_data = get_music_data()
-
-
-def fetch_aqua_sqlite(user_id: int):
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-
-    cursor.execute(
-        """
-        SELECT music_id, level, achievement, combo_status, sync_status, deluxscore_max
-        FROM maimai2_user_music_detail
-        WHERE user_id = ?
-        """,
-        (user_id,),
+from .aqua_db import get_connection
+from .chart_score import (
+    from_aqua_rows,
+    from_diving_fish_records,
+    to_diving_fish_records,
+)
+from .diving_fish_prober import get_client, get_music_data
+from .chunked_upload import UploadCheckpoint, upload_in_chunks
+from .instrumentation import span, timed
+from .music_catalog import MusicCatalog
+from .score_merge import hash_join
+from .sync_state import UPLOAD, SyncStateJournal, account_key, content_hash
+
+_music_catalog = None
+_music_catalog_lock = threading.Lock()
+
+
+def get_music_catalog(config):
+    """首次使用时才加载 music_data 并建立索引，多个线程共用同一份"""
+    global _music_catalog
+    with _music_catalog_lock:
+        if _music_catalog is None:
+            with span("upload.music_catalog"):
+                _music_catalog = MusicCatalog(get_music_data(config))
+    return _music_catalog
+
+
+SELECT_USER_SCORES_SQL = """
+    SELECT music_id, level, achievement, combo_status, sync_status, deluxscore_max
+    FROM maimai2_user_music_detail
+    WHERE user_id = ?
+"""
+
+
+@timed("upload.fetch_aqua")
+def fetch_aqua_sqlite(conn, user_id: int):
+    return conn.execute(SELECT_USER_SCORES_SQL, (user_id,)).fetchall()
+
+
+@timed("upload.convert")
+def parse_aqua_data(aqua_records, music_catalog):
+    """将 Aqua 成绩转换为 ChartScore，跳过 music_data 中没有的歌曲"""
+    return from_aqua_rows(
+        record for record in aqua_records if record[0] in music_catalog
     )
-    records = cursor.fetchall()
-
-    conn.close()
-    return records
-
 
-def parse_aqua_data(aqua_records):
-    diving_fish_data = []
 
-    # 创建一个包含所有 diving_fish_music_datails_data 中 id 的集合
-    valid_song_ids = {int(song["id"]) for song in diving_fish_music_details_data}
+def filter_changed_records(aqua_records, sync_state):
+    """根据同步状态筛选出上次上传后发生变化的 Aqua 成绩
 
+    Returns:
+        tuple: (变化的 Aqua 成绩, 对应的同步状态条目)
+    """
+    changed_records = []
+    entries = []
     for record in aqua_records:
-        if record[0] in valid_song_ids:
-            music_detail = next(
-                (
-                    item
-                    for item in diving_fish_music_details_data
-                    if int(item["id"]) == record[0]
-                ),
-                None,
-            )
-            if music_detail:
-                diving_fish_record = {
-                    "song_id": record[0],
-                    "level_index": record[1],
-                    "achievements": parse_achievements(record[2]),
-                    "fc": parse_combo_status(record[3]),
-                    "fs": parse_sync_status(record[4]),
-                    "dxScore": record[5],
-                    "title": music_detail["title"],
-                }
-                diving_fish_data.append(diving_fish_record)
-
-    return diving_fish_data
-
-
-def parse_combo_status(fc_value):
-    switcher = {1: "fc", 2: "fcp", 3: "ap", 4: "app"}
-    return switcher.get(fc_value, "")
-
-
-def parse_sync_status(fs_value):
-    switcher = {5: "sync", 1: "fs", 2: "fsp", 3: "fsd", 4: "fsdp"}
-    return switcher.get(fs_value, "")
-
-
-def parse_achievements(achievements: int):
-    parsed_achievements = achievements / 10000
-    return round(parsed_achievements, 4)
-
-
-def compare_combo_status(fc_value1, fc_value2):
-    switcher = {"": 0, "fc": 1, "fcp": 2, "ap": 3, "app": 4}
-    return switcher.get(fc_value1, 0) - switcher.get(fc_value2, 0)
-
-
-def compare_sync_status(fs_value1, fs_value2):
-    switcher = {"": 0, "fs": 1, "fsp": 2, "fsd": 3, "fsdp": 4, "sync": 5}
-    return switcher.get(fs_value1, 0) - switcher.get(fs_value2, 0)
-
-
-def aquadx_data_upload(user_id: int, overwrite: bool = False):
+        key = (record[0], record[1])
+        values = tuple(record[2:6])
+        digest = content_hash(values)
+        last_state = sync_state.get(key)
+        if last_state is not None and last_state[0] == digest:
+            continue
+        changed_records.append(record)
+        entries.append((key, digest, values))
+    return changed_records, entries
+
+
+@timed("upload.total")
+def aquadx_data_upload(
+    config, user_id: int, overwrite: bool = False, incremental: bool = True
+):
     """_summary_
 
     Args:
+        config (dict): adm_config.json 中的配置
         user_id (int): 用于指示 db.sqlite 中的用户
         overwrite (bool, optional): 是否覆写（否则择优）. Defaults to False.
+        incremental (bool, optional): 是否只上传上次同步后变化的谱面. Defaults to True.
     """
-    aqua_records = fetch_aqua_sqlite(user_id)
-    aqua_to_diving_fish_records = parse_aqua_data(aqua_records)
+    aqua_records = fetch_aqua_sqlite(get_connection(config), user_id)
+    account = account_key(config)
+
+    with SyncStateJournal() as journal:
+        if overwrite or not incremental:
+            sync_state = {}
+        else:
+            sync_state = journal.load(user_id, account, UPLOAD)
+        aqua_records, entries = filter_changed_records(aqua_records, sync_state)
+
+        if not aqua_records and not overwrite:
+            print("AquaDX 成绩自上次上传后没有变化。")
+            return {"status": "unchanged", "message": "没有需要上传的成绩"}
+
+        response = upload_records(config, aqua_records, overwrite)
+
+        if response.get("message") == "更新成功":
+            if overwrite:
+                journal.reset(user_id, account, UPLOAD)
+            # 不在 music_data 中的谱面没有被上传，不记录同步状态
+            music_catalog = get_music_catalog(config)
+            journal.record(
+                user_id,
+                account,
+                UPLOAD,
+                (entry for entry in entries if entry[0][0] in music_catalog),
+            )
+
+    return response
 
-    client = ProberAPIClient()
 
-    diving_fish_player_records = client.get_player_full_scores(
-        username=config["username"], password=config["password"]
-    )
+@timed("upload.merge_remote")
+def merge_with_remote(aqua_scores, remote_records):
+    """以本地变化的谱面建立索引，流式遍历 diving-fish 成绩并择优合并
 
-    combined_records = diving_fish_player_records["records"]
+    diving-fish 上的 DX 分数保持不变，与原先的择优规则一致。
+    """
+    merged_scores = {score.key: score for score in aqua_scores}
+    matched_records = [
+        record
+        for _, score, record in hash_join(merged_scores, remote_records)
+        if score is not None
+    ]
+    for remote_score in from_diving_fish_records(matched_records):
+        remote_score.merge_best(merged_scores[remote_score.key])
+        merged_scores[remote_score.key] = remote_score
+    return list(merged_scores.values())
 
-    if not overwrite:
-        for record in tqdm(
-            aqua_to_diving_fish_records, desc="Uploading data to diving-fish"
-        ):
-            song_id = record["song_id"]
-            level_index = record["level_index"]
-            for chart in combined_records:
-                if chart["song_id"] == song_id and chart["level_index"] == level_index:
-                    if record["achievements"] > chart["achievements"]:
-                        chart["achievements"] = record["achievements"]
-
-                    if compare_combo_status(record["fc"], chart["fc"]) > 0:
-                        chart["fc"] = record["fc"]
-
-                    if compare_sync_status(record["fs"], chart["fs"]) > 0:
-                        chart["fs"] = record["fs"]
-                    chart["title"] = record["title"]
-                    break
-
-            else:
-                combined_records.append(record)
-    else:
-        combined_records = aqua_to_diving_fish_records
 
-        client.delete_player_records(
+def upload_records(config, aqua_records, overwrite):
+    music_catalog = get_music_catalog(config)
+    aqua_scores = parse_aqua_data(aqua_records, music_catalog)
+
+    client = get_client(config)
+
+    if not overwrite:
+        diving_fish_player_records = client.iter_player_records(
             username=config["username"], password=config["password"]
         )
 
-    records = []
-    for record in combined_records:
-        music_detail = next(
-            (
-                item
-                for item in diving_fish_music_details_data
-                if item["title"] == record["title"]
-            ),
-            None,
+        # 只上传本次变化的谱面，与 diving-fish 上的同一谱面择优合并
+        aqua_scores = merge_with_remote(
+            aqua_scores,
+            tqdm(diving_fish_player_records, desc="Merging diving-fish records"),
         )
 
-        if music_detail:
-            records.append(
-                {
-                    "achievements": record["achievements"],
-                    "dxScore": record["dxScore"],
-                    "fc": record["fc"],
-                    "fs": record["fs"],
-                    "level_index": record["level_index"],
-                    "title": record["title"],
-                    "type": music_detail["type"],
-                }
-            )
+    with span("upload.convert"):
+        records = to_diving_fish_records(aqua_scores, music_catalog)
 
-    response = client.update_records(
-        username=config["username"],
-        password=config["password"],
-        records=records,
-    )
+    checkpoint = UploadCheckpoint.for_records(config, records)
+
+    # 从断点续传时已上传的部分不能再被清除
+    if overwrite and checkpoint.confirmed_chunks == 0:
+        client.delete_player_records(
+            username=config["username"], password=config["password"]
+        )
+
+    response = upload_in_chunks(config, client, records, checkpoint)
 
     return response
@@ -0,0 +1,136 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from .diving_fish_prober import ProberAPIClient
+from .init_config import DEFAULT_NETWORK_TIMEOUT, DEFAULT_PROBER_CONCURRENCY
+from .pipeline import iter_batches
+
+RECORD_BATCH_SIZE = 1000
+
+
+class ProberConnectionPool:
+    """多个 diving-fish 客户端共用的连接池与请求线程
+
+    每个账号有独立的 Session 保存登录状态，底层连接由同一个 HTTPAdapter 复用，
+    同时进行的请求数不超过 concurrency。请求经由 ProberTransport 发送，
+    与同步客户端共用进程内的限速器与熔断器。
+    """
+
+    def __init__(
+        self,
+        concurrency=DEFAULT_PROBER_CONCURRENCY,
+        network_timeout=DEFAULT_NETWORK_TIMEOUT,
+        config=None,
+    ):
+        self.concurrency = concurrency
+        self.network_timeout = network_timeout
+        # 重试次数、退避与限速等设置从 config 读取
+        self.config = {**(config or {}), "network_timeout": network_timeout}
+        self.adapter = HTTPAdapter(pool_connections=1, pool_maxsize=concurrency)
+        self.executor = ThreadPoolExecutor(
+            max_workers=concurrency, thread_name_prefix="prober"
+        )
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            config.get("prober_concurrency", DEFAULT_PROBER_CONCURRENCY),
+            config.get("network_timeout", DEFAULT_NETWORK_TIMEOUT),
+            config,
+        )
+
+    def create_client(self, username="", password=""):
+        """创建使用本连接池的同步客户端"""
+        session = requests.Session()
+        session.mount("https://", self.adapter)
+        session.mount("http://", self.adapter)
+        client = ProberAPIClient.from_config(self.config, session)
+        client.username = username
+        client.password = password
+        return client
+
+    async def run(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor, functools.partial(func, *args, **kwargs)
+        )
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        self.adapter.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
+
+
+class AsyncProberAPIClient:
+    """ProberAPIClient 的 asyncio 版本，方法与同步客户端一致
+
+    请求在连接池的线程中执行，多个账号或多个上传块可以同时等待网络。
+    """
+
+    def __init__(self, pool, username="", password=""):
+        self.pool = pool
+        self.sync_client = pool.create_client(username, password)
+
+    @property
+    def base_url(self):
+        return self.sync_client.base_url
+
+    @base_url.setter
+    def base_url(self, value):
+        self.sync_client.base_url = value
+
+    async def login(self):
+        return await self.pool.run(self.sync_client.login)
+
+    async def get_player_full_scores(self, username, password):
+        return await self.pool.run(
+            self.sync_client.get_player_full_scores, username, password
+        )
+
+    async def iter_player_records(self, username, password, meta=None):
+        """流式获取玩家成绩，下载与解析在连接池的线程中进行，每次取回一批成绩
+
+        Args:
+            username (str): diving-fish 用户名
+            password (str): diving-fish 密码
+            meta (dict, optional): 用于接收响应中 records 以外字段的字典. Defaults to None.
+        """
+        batches = iter_batches(
+            self.sync_client.iter_player_records(username, password, meta),
+            RECORD_BATCH_SIZE,
+        )
+        try:
+            while True:
+                batch = await self.pool.run(next, batches, None)
+                if batch is None:
+                    return
+                for record in batch:
+                    yield record
+        finally:
+            # 提前停止迭代时关闭响应，释放连接
+            await self.pool.run(batches.close)
+
+    async def get_music_data(self):
+        return await self.pool.run(self.sync_client.get_music_data)
+
+    async def fetch_music_data(self, etag="", last_modified=""):
+        return await self.pool.run(
+            self.sync_client.fetch_music_data, etag, last_modified
+        )
+
+    async def update_records(self, username, password, records, strict=False):
+        return await self.pool.run(
+            self.sync_client.update_records, username, password, records, strict
+        )
+
+    async def delete_player_records(self, username, password):
+        return await self.pool.run(
+            self.sync_client.delete_player_records, username, password
+        )
@@ -0,0 +1,203 @@
+"""按任务文件为多个玩家批量同步成绩，全程无需交互
+
+用法: python -m src.batch_sync jobs.json [--workers 4] [--summary summary.json]
+
+任务文件中每个任务对应一个 Aqua 玩家与一个 diving-fish 账号:
+
+    {"jobs": [
+        {"user_id": 1, "username": "...", "password": "...", "direction": "upload"},
+        {"user_id": 2, "username": "...", "password": "...", "direction": "download",
+         "overwrite": false}
+    ]}
+
+direction 为 upload（AquaDX 上传至 diving-fish）或 download（diving-fish 同步至 AquaDX）。
+"""
+
+import argparse
+import json
+import queue
+import threading
+import time
+from .aqua_db import close_connections, get_connection
+from .aquadx_to_diving_fish import aquadx_data_upload, get_music_catalog
+from .db_index import drop_index, prepare_index
+from .diving_fish_prober import get_client, stream_player_scores
+from .diving_fish_to_aquadx import save_player_scores
+from .init_config import load_config
+
+UPLOAD = "upload"
+DOWNLOAD = "download"
+DEFAULT_WORKERS = 4
+
+
+def load_jobs(path):
+    """读取并校验任务文件
+
+    Args:
+        path (str): 任务文件路径
+
+    Returns:
+        list: 任务列表，每项包含 user_id、username、password、direction 与 overwrite
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    jobs = data.get("jobs") if isinstance(data, dict) else data
+    if not isinstance(jobs, list):
+        raise ValueError("任务文件中缺少 jobs 列表")
+
+    for index, job in enumerate(jobs, 1):
+        for key in ("user_id", "username", "password", "direction"):
+            if key not in job:
+                raise ValueError(f"第 {index} 个任务缺少 {key}")
+        if job["direction"] not in (UPLOAD, DOWNLOAD):
+            raise ValueError(
+                f"第 {index} 个任务的 direction 只能是 {UPLOAD} 或 {DOWNLOAD}"
+            )
+        job["user_id"] = int(job["user_id"])
+        job["overwrite"] = bool(job.get("overwrite", False))
+    return jobs
+
+
+def run_job(config, job, write_lock):
+    """执行单个同步任务，返回该任务的结果与耗时
+
+    下载任务先并行从 diving-fish 取回全部成绩，再持有 write_lock 写入数据库，
+    避免多个写事务同时等待 sqlite 的写锁。
+    """
+    job_config = dict(config, username=job["username"], password=job["password"])
+    result = {
+        "user_id": job["user_id"],
+        "username": job["username"],
+        "direction": job["direction"],
+    }
+    start = time.perf_counter()
+    try:
+        get_client(job_config).login()
+        if job["direction"] == DOWNLOAD:
+            payload = stream_player_scores(job_config)
+            payload["records"] = list(payload["records"])
+            with write_lock:
+                stats = save_player_scores(
+                    job_config, payload, job["user_id"], overwrite=job["overwrite"]
+                )
+            result["status"] = "ok"
+            result["detail"] = f"新增 {stats['inserted']}，更新 {stats['updated']}"
+        else:
+            response = aquadx_data_upload(
+                job_config, user_id=job["user_id"], overwrite=job["overwrite"]
+            )
+            if response.get("message") == "更新成功":
+                result["status"] = "ok"
+            elif response.get("status") == "unchanged":
+                result["status"] = "unchanged"
+            else:
+                result["status"] = "failed"
+            result["detail"] = response.get("message", "")
+    except Exception as e:
+        result["status"] = "failed"
+        result["detail"] = str(e)
+    result["elapsed"] = time.perf_counter() - start
+    return result
+
+
+def _worker(config, tasks, results, write_lock):
+    """从队列中依次取出任务执行，线程内的数据库连接在所有任务间复用"""
+    try:
+        while True:
+            try:
+                index, job = tasks.get_nowait()
+            except queue.Empty:
+                return
+            results[index] = run_job(config, job, write_lock)
+    finally:
+        close_connections()
+
+
+def run_jobs(config, jobs, workers=DEFAULT_WORKERS):
+    """以最多 workers 个线程并行执行任务
+
+    Args:
+        config (dict): adm_config.json 中的配置
+        jobs (list): load_jobs 返回的任务列表
+        workers (int, optional): 同时执行的任务数. Defaults to DEFAULT_WORKERS.
+
+    Returns:
+        list: 与 jobs 顺序一致的任务结果
+    """
+    if any(job["direction"] == UPLOAD for job in jobs):
+        # 所有上传任务共用同一份曲目数据
+        get_music_catalog(config)
+
+    tasks = queue.Queue()
+    for index, job in enumerate(jobs):
+        tasks.put((index, job))
+    results = [None] * len(jobs)
+    write_lock = threading.Lock()
+
+    threads = [
+        threading.Thread(target=_worker, args=(config, tasks, results, write_lock))
+        for _ in range(max(1, min(workers, len(jobs))))
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def print_summary(results, elapsed):
+    print(f"{'user_id':>8}  {'账号':<20} {'方向':<9} {'状态':<10} {'耗时':>8}  信息")
+    for result in results:
+        print(
+            f"{result['user_id']:>8}  {result['username']:<20} "
+            f"{result['direction']:<9} {result['status']:<10} "
+            f"{result['elapsed']:>7.2f}s  {result['detail']}"
+        )
+    failed = sum(result["status"] == "failed" for result in results)
+    print(f"共 {len(results)} 个任务，失败 {failed} 个，总耗时 {elapsed:.2f}s")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="按任务文件批量同步多个玩家的成绩")
+    parser.add_argument("jobs", help="任务文件路径")
+    parser.add_argument(
+        "--workers", type=int, default=DEFAULT_WORKERS, help="同时执行的任务数"
+    )
+    parser.add_argument("--summary", help="将任务结果写入该 JSON 文件")
+    args = parser.parse_args(argv)
+
+    config = load_config()
+    jobs = load_jobs(args.jobs)
+    if not jobs:
+        print("任务文件中没有任务。")
+        return 0
+
+    # 批量模式不询问，db_index 为 ask 时不创建索引
+    if config.get("db_index", "ask") == "ask":
+        config = dict(config, db_index="off")
+    temporary_index = prepare_index(config, get_connection(config))
+
+    start = time.perf_counter()
+    try:
+        results = run_jobs(config, jobs, args.workers)
+    finally:
+        if temporary_index:
+            drop_index(get_connection(config))
+        close_connections()
+    elapsed = time.perf_counter() - start
+
+    print_summary(results, elapsed)
+    if args.summary:
+        with open(args.summary, "w", encoding="utf-8") as f:
+            json.dump(
+                {"elapsed": elapsed, "results": results},
+                f,
+                ensure_ascii=False,
+                indent=2,
+            )
+    return 1 if any(result["status"] == "failed" for result in results) else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,597 @@
+"""性能基准测试
+
+用法:
+    python -m src.bench startup [--runs N]
+    python -m src.bench records [--count N] [--runs N]
+    python -m src.bench sync [--charts N] [--users N] [--runs N] [--index] [--fault-rate P]
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from .aqua_db import close_connections, get_connection
+from .aquadx_to_diving_fish import (
+    aquadx_data_upload,
+    fetch_aqua_sqlite,
+    get_music_catalog,
+    parse_aqua_data,
+)
+from .chart_score import (
+    from_aqua_rows,
+    from_diving_fish_records,
+    to_diving_fish_records,
+)
+from .db_index import create_index
+from .diving_fish_prober import get_client
+from .diving_fish_to_aquadx import save_player_scores
+from .init_config import CONFIG_FILE, get_db_path
+from .instrumentation import snapshot
+from .music_catalog import MusicCatalog
+from .snapshot import load_snapshot, save_snapshot
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 在子进程中统计从导入 main 到完成 check_files 的耗时、配置文件读取次数与网络连接次数
+STARTUP_SCRIPT = """
+import builtins
+import json
+import socket
+import sys
+import time
+
+counters = {"config_reads": 0, "network_connects": 0}
+_open = builtins.open
+_connect = socket.socket.connect
+
+
+def counting_open(file, *args, **kwargs):
+    if str(file).endswith("adm_config.json"):
+        counters["config_reads"] += 1
+    return _open(file, *args, **kwargs)
+
+
+def counting_connect(self, *args, **kwargs):
+    counters["network_connects"] += 1
+    return _connect(self, *args, **kwargs)
+
+
+builtins.open = counting_open
+socket.socket.connect = counting_connect
+
+start = time.perf_counter()
+sys.path.insert(0, sys.argv[1])
+import main
+
+config = main.check_files()
+counters["elapsed"] = time.perf_counter() - start
+counters["config_loaded"] = config is not None
+print(json.dumps(counters))
+"""
+
+
+def prepare_workdir(workdir):
+    aqua_path = os.path.join(workdir, "aqua")
+    os.makedirs(os.path.join(aqua_path, "data"))
+    open(os.path.join(aqua_path, "data", "db.sqlite"), "wb").close()
+    with open(os.path.join(workdir, "adm_config.json"), "w", encoding="utf-8") as f:
+        json.dump({"username": "bench", "password": "bench", "aqua_path": aqua_path}, f)
+
+
+def bench_startup(runs):
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        prepare_workdir(workdir)
+        for _ in range(runs):
+            output = subprocess.run(
+                [sys.executable, "-c", STARTUP_SCRIPT, REPO_ROOT],
+                cwd=workdir,
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout
+            results.append(json.loads(output.strip().splitlines()[-1]))
+
+    timings = [result["elapsed"] for result in results]
+    return {
+        "benchmark": "startup",
+        "runs": runs,
+        "median_seconds": statistics.median(timings),
+        "min_seconds": min(timings),
+        "max_seconds": max(timings),
+        "config_reads": max(result["config_reads"] for result in results),
+        "network_connects": max(result["network_connects"] for result in results),
+    }
+
+
+class LegacySongScore:
+    """改用 ChartScore 之前的 song_score，仅用于对比"""
+
+    def __init__(self, music_id, level, achievement, combo_status, sync_status, dx):
+        self.id = None
+        self.music_id = music_id
+        self.level = level
+        self.play_count = 1
+        self.achievement = achievement
+        self.combo_status = combo_status
+        self.sync_status = sync_status
+        self.deluxscore_max = dx
+        self.score_rank = 0
+        self.user_id = None
+        self.ext_num1 = 0
+
+
+def legacy_download_path(records):
+    def parse_combo_status(fc_value):
+        switcher = {"fc": 1, "fcp": 2, "ap": 3, "app": 4}
+        return switcher.get(fc_value, 0)
+
+    def parse_sync_status(fs_value):
+        switcher = {"sync": 5, "fs": 1, "fsp": 2, "fsd": 3, "fsdp": 4}
+        return switcher.get(fs_value, 0)
+
+    return [
+        LegacySongScore(
+            record["song_id"],
+            record["level_index"],
+            int(10000 * record["achievements"]),
+            parse_combo_status(record["fc"]),
+            parse_sync_status(record["fs"]),
+            record["dxScore"],
+        )
+        for record in records
+    ]
+
+
+def legacy_upload_path(rows, music_catalog):
+    def parse_combo_status(fc_value):
+        switcher = {1: "fc", 2: "fcp", 3: "ap", 4: "app"}
+        return switcher.get(fc_value, "")
+
+    def parse_sync_status(fs_value):
+        switcher = {5: "sync", 1: "fs", 2: "fsp", 3: "fsd", 4: "fsdp"}
+        return switcher.get(fs_value, "")
+
+    parsed = []
+    for row in rows:
+        music_detail = music_catalog.get_by_id(row[0])
+        if music_detail:
+            parsed.append(
+                {
+                    "song_id": row[0],
+                    "level_index": row[1],
+                    "achievements": round(row[2] / 10000, 4),
+                    "fc": parse_combo_status(row[3]),
+                    "fs": parse_sync_status(row[4]),
+                    "dxScore": row[5],
+                    "title": music_detail["title"],
+                }
+            )
+    records = []
+    for record in parsed:
+        music_detail = music_catalog.get_by_title(record["title"])
+        records.append(
+            {
+                "achievements": record["achievements"],
+                "dxScore": record["dxScore"],
+                "fc": record["fc"],
+                "fs": record["fs"],
+                "level_index": record["level_index"],
+                "title": record["title"],
+                "type": music_detail["type"],
+            }
+        )
+    return records
+
+
+def chart_score_upload_path(rows, music_catalog):
+    return to_diving_fish_records(from_aqua_rows(rows), music_catalog)
+
+
+def synthetic_records(count, song_count):
+    rng = random.Random(0)
+    fc_values = ["", "fc", "fcp", "ap", "app"]
+    fs_values = ["", "sync", "fs", "fsp", "fsd", "fsdp"]
+    return [
+        {
+            "song_id": index % song_count,
+            "level_index": index // song_count % 5,
+            "achievements": round(rng.uniform(80, 101), 4),
+            "fc": rng.choice(fc_values),
+            "fs": rng.choice(fs_values),
+            "dxScore": rng.randint(0, 3000),
+            "title": f"song{index % song_count}",
+            "type": "DX",
+        }
+        for index in range(count)
+    ]
+
+
+def measure(func, *args, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - start)
+
+    # 统计结果保留在内存中时的峰值
+    tracemalloc.start()
+    result = func(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del result
+    return {"median_seconds": statistics.median(timings), "peak_bytes": peak}
+
+
+def bench_records(count, runs):
+    song_count = max(count // 5, 1)
+    music_catalog = MusicCatalog(
+        [
+            {"id": str(song_id), "title": f"song{song_id}", "type": "DX"}
+            for song_id in range(song_count)
+        ]
+    )
+    records = synthetic_records(count, song_count)
+    rows = [
+        (
+            score.music_id,
+            score.level,
+            score.achievement,
+            score.combo_status,
+            score.sync_status,
+            score.deluxscore_max,
+        )
+        for score in from_diving_fish_records(records)
+    ]
+
+    return {
+        "benchmark": "records",
+        "count": count,
+        "runs": runs,
+        "download": {
+            "dict": measure(legacy_download_path, records, runs=runs),
+            "chart_score": measure(from_diving_fish_records, records, runs=runs),
+        },
+        "upload": {
+            "dict": measure(legacy_upload_path, rows, music_catalog, runs=runs),
+            "chart_score": measure(
+                chart_score_upload_path, rows, music_catalog, runs=runs
+            ),
+        },
+    }
+
+
+def synthetic_music_data(song_count):
+    return [
+        {
+            "id": str(song_id),
+            "title": f"song{song_id}",
+            "type": "DX",
+            "ds": [3.0, 7.0, 10.5, 13.0, 14.5],
+            "level": ["3", "7", "10+", "13", "14+"],
+        }
+        for song_id in range(song_count)
+    ]
+
+
+CREATE_USER_DETAIL_SQL = """
+    CREATE TABLE maimai2_user_detail (
+        id INTEGER PRIMARY KEY, user_name TEXT, player_rating INTEGER
+    )
+"""
+
+CREATE_MUSIC_DETAIL_SQL = """
+    CREATE TABLE maimai2_user_music_detail (
+        id INTEGER PRIMARY KEY, music_id INTEGER, level INTEGER,
+        play_count INTEGER, achievement INTEGER, combo_status INTEGER,
+        sync_status INTEGER, deluxscore_max INTEGER, score_rank INTEGER,
+        user_id INTEGER, ext_num1 INTEGER
+    )
+"""
+
+
+def build_synthetic_db(db_path, charts, users, song_count):
+    """生成 users 个玩家、每人 charts 个谱面成绩的 Aqua 数据库"""
+    rng = random.Random(1)
+
+    def music_detail_rows():
+        row_id = 0
+        for user_id in range(1, users + 1):
+            for index in range(charts):
+                row_id += 1
+                yield (
+                    row_id,
+                    index % song_count,
+                    index // song_count % 5,
+                    1,
+                    rng.randint(800000, 1010000),
+                    rng.randint(0, 4),
+                    rng.randint(0, 5),
+                    rng.randint(0, 3000),
+                    0,
+                    user_id,
+                    0,
+                )
+
+    conn = sqlite3.connect(db_path)
+    try:
+        with conn:
+            conn.execute(CREATE_USER_DETAIL_SQL)
+            conn.execute(CREATE_MUSIC_DETAIL_SQL)
+            conn.executemany(
+                "INSERT INTO maimai2_user_detail VALUES (?, ?, ?)",
+                ((user_id, f"user{user_id}", 0) for user_id in range(1, users + 1)),
+            )
+            conn.executemany(
+                "INSERT INTO maimai2_user_music_detail VALUES "
+                "(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                music_detail_rows(),
+            )
+    finally:
+        conn.close()
+
+
+class MockProberHandler(BaseHTTPRequestHandler):
+    """diving-fish 接口的本地替身，响应内容在启动前预先编码
+
+    fault_rate 大于 0 时按该概率返回 503，用于测试重试与熔断；
+    failing_uploads 中的序号对应的 update_records 请求返回 500，用于测试分块续传；
+    truncate_bodies 为 True 时响应体只发送一半就断开连接。
+    """
+
+    def log_message(self, format, *args):
+        pass
+
+    def inject_fault(self):
+        with self.server.fault_lock:
+            if self.server.fault_random.random() >= self.server.fault_rate:
+                return False
+            self.server.injected_faults += 1
+        self.send_response(503)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+        return True
+
+    def send_body(self, body, headers=None, status=200):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.server.truncate_bodies:
+            self.wfile.write(body[: len(body) // 2])
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.inject_fault():
+            return
+        if self.path.endswith("/music_data"):
+            if self.headers.get("If-None-Match") == self.server.music_data_etag:
+                self.send_response(304)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_body(
+                self.server.music_data, {"ETag": self.server.music_data_etag}
+            )
+        elif self.path.endswith("/player/records"):
+            self.send_body(self.server.player_records)
+        else:
+            self.send_error(404)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.inject_fault():
+            return
+        if self.path.endswith("/login"):
+            self.send_body(b"{}", {"Set-Cookie": "jwt_token=bench; Path=/"})
+        elif self.path.endswith("/player/update_records"):
+            with self.server.fault_lock:
+                upload_index = self.server.upload_requests
+                self.server.upload_requests += 1
+            if upload_index in self.server.failing_uploads:
+                self.send_body(
+                    json.dumps({"message": "服务器错误"}).encode("utf-8"), status=500
+                )
+                return
+            chunk = json.loads(body)
+            self.server.uploaded_chunks.append(chunk)
+            self.server.uploaded_records += len(chunk)
+            self.send_body(json.dumps({"message": "更新成功"}).encode("utf-8"))
+        else:
+            self.send_error(404)
+
+    def do_DELETE(self):
+        self.server.delete_requests += 1
+        self.send_body(json.dumps({"message": "删除成功"}).encode("utf-8"))
+
+
+@contextlib.contextmanager
+def mock_prober_server(records, music_data, fault_rate=0.0):
+    """在本地线程中启动 diving-fish 替身，返回的 server.base_url 为接口地址"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MockProberHandler)
+    server.fault_rate = fault_rate
+    server.fault_random = random.Random(0)
+    server.fault_lock = threading.Lock()
+    server.injected_faults = 0
+    server.player_records = json.dumps(
+        {"username": "bench", "records": records}
+    ).encode("utf-8")
+    server.music_data = json.dumps(music_data).encode("utf-8")
+    server.music_data_etag = '"bench"'
+    server.uploaded_records = 0
+    server.uploaded_chunks = []
+    server.upload_requests = 0
+    server.failing_uploads = set()
+    server.delete_requests = 0
+    server.truncate_bodies = False
+    server.base_url = f"http://127.0.0.1:{server.server_address[1]}/api/maimaidxprober"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def measure_runs(func, runs, setup=None):
+    """多次计时 func，setup 在每次计时前执行且不计入耗时"""
+    timings = []
+    for _ in range(runs):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return {
+        "median_seconds": statistics.median(timings),
+        "min_seconds": min(timings),
+        "max_seconds": max(timings),
+    }
+
+
+def bench_sync(charts, users, runs, index=False, fault_rate=0.0):
+    """在临时目录中生成数据库与曲目数据，对本地替身计时各同步路径"""
+    song_count = max(-(-charts // 5), 1)
+    records = synthetic_records(charts, song_count)
+    previous_dir = os.getcwd()
+
+    with tempfile.TemporaryDirectory() as workdir, mock_prober_server(
+        records, synthetic_music_data(song_count), fault_rate
+    ) as server:
+        # 附属文件均位于 adm_config.json 同目录，切换到临时目录以免影响真实数据
+        os.chdir(workdir)
+        try:
+            config = {
+                "username": "bench",
+                "password": "bench",
+                "aqua_path": os.path.join(workdir, "aqua"),
+                "db_index": "off",
+                # 不限速，且重试等待尽量短，耗时只反映本工具自身
+                "prober_rate_limit": 0,
+                "network_retry_backoff": 0.01,
+            }
+            with open(CONFIG_FILE, "w", encoding="utf-8") as f:
+                json.dump(config, f)
+            db_path = get_db_path(config)
+            os.makedirs(os.path.dirname(db_path))
+            build_synthetic_db(db_path, charts, users, song_count)
+            if index:
+                create_index(get_connection(config))
+                close_connections()
+            pristine_path = os.path.join(workdir, "pristine.sqlite")
+            shutil.copyfile(db_path, pristine_path)
+
+            def restore_db():
+                close_connections()
+                shutil.copyfile(pristine_path, db_path)
+
+            get_client(config).base_url = server.base_url
+            snapshot_path = os.path.join(workdir, "bench_save.sqlite")
+            results = {}
+            # 进度条与提示输出到 stderr，stdout 只保留 JSON 结果
+            with contextlib.redirect_stdout(sys.stderr):
+                catalog_start = time.perf_counter()
+                music_catalog = get_music_catalog(config)
+                results["music_catalog"] = {
+                    "median_seconds": time.perf_counter() - catalog_start
+                }
+                results["save_player_scores"] = measure_runs(
+                    lambda: save_player_scores(
+                        config, {"records": iter(records)}, 1, incremental=False
+                    ),
+                    runs,
+                    setup=restore_db,
+                )
+                restore_db()
+                rows = fetch_aqua_sqlite(get_connection(config), 1)
+                results["parse_aqua_data"] = measure_runs(
+                    lambda: parse_aqua_data(rows, music_catalog), runs
+                )
+                results["aquadx_data_upload"] = measure_runs(
+                    lambda: aquadx_data_upload(config, 1, incremental=False), runs
+                )
+                results["save_game"] = measure_runs(
+                    lambda: save_snapshot(config, snapshot_path), runs
+                )
+                results["load_game"] = measure_runs(
+                    lambda: load_snapshot(config, snapshot_path), runs
+                )
+        finally:
+            close_connections()
+            os.chdir(previous_dir)
+
+    return {
+        "benchmark": "sync",
+        "charts": charts,
+        "users": users,
+        "rows": charts * users,
+        "runs": runs,
+        "index": index,
+        "fault_rate": fault_rate,
+        "http_retries": snapshot()["counters"].get("http.retries", 0),
+        "results": results,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="AquaDX-DB-Manager 性能基准测试")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    startup_parser = subparsers.add_parser("startup", help="启动到菜单前的耗时")
+    startup_parser.add_argument("--runs", type=int, default=10)
+
+    records_parser = subparsers.add_parser(
+        "records", help="成绩转换的耗时与内存，对比字典与 ChartScore"
+    )
+    records_parser.add_argument("--count", type=int, default=50000)
+    records_parser.add_argument("--runs", type=int, default=5)
+
+    sync_parser = subparsers.add_parser(
+        "sync", help="使用合成数据库与本地 diving-fish 替身对同步与存档计时"
+    )
+    sync_parser.add_argument(
+        "--charts", type=int, default=10000, help="每个玩家的谱面成绩数"
+    )
+    sync_parser.add_argument("--users", type=int, default=10, help="数据库中的玩家数")
+    sync_parser.add_argument("--runs", type=int, default=3)
+    sync_parser.add_argument(
+        "--index", action="store_true", help="预先创建按 user_id 的索引"
+    )
+    sync_parser.add_argument(
+        "--fault-rate",
+        type=float,
+        default=0.0,
+        help="diving-fish 替身返回 503 的概率，用于测试重试",
+    )
+
+    args = parser.parse_args(argv)
+    if args.command == "startup":
+        result = bench_startup(args.runs)
+    elif args.command == "records":
+        result = bench_records(args.count, args.runs)
+    elif args.command == "sync":
+        result = bench_sync(
+            args.charts, args.users, args.runs, args.index, args.fault_rate
+        )
+
+    print(json.dumps(result, ensure_ascii=False, indent=4))
+
+
+if __name__ == "__main__":
+    main()
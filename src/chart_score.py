@@ -0,0 +1,161 @@
+from .score_codec import (
+    AQUA_COMBO_RANK,
+    AQUA_SYNC_RANK,
+    to_aqua_achievements,
+    to_aqua_combo_status,
+    to_aqua_sync_status,
+    to_diving_fish_achievements,
+    to_diving_fish_combo_status,
+    to_diving_fish_sync_status,
+)
+
+
+class ChartScore:
+    """单个谱面的成绩，数值均为 Aqua 数据库中的编码
+
+    替代原先的 song_score 与各处的成绩字典，两个同步方向共用。
+    """
+
+    __slots__ = (
+        "id",
+        "music_id",
+        "level",
+        "play_count",
+        "achievement",
+        "combo_status",
+        "sync_status",
+        "deluxscore_max",
+        "score_rank",
+        "user_id",
+        "ext_num1",
+    )
+
+    def __init__(
+        self,
+        music_id,
+        level,
+        achievement,
+        combo_status,
+        sync_status,
+        deluxscore_max,
+        id=None,
+        play_count=1,
+        score_rank=0,
+        user_id=None,
+        ext_num1=0,
+    ):
+        self.id = id
+        self.music_id = music_id
+        self.level = level
+        self.play_count = play_count
+        self.achievement = achievement
+        self.combo_status = combo_status
+        self.sync_status = sync_status
+        self.deluxscore_max = deluxscore_max
+        self.score_rank = score_rank
+        self.user_id = user_id
+        self.ext_num1 = ext_num1
+
+    @property
+    def key(self):
+        return (self.music_id, self.level)
+
+    def score_values(self):
+        return (
+            self.achievement,
+            self.combo_status,
+            self.sync_status,
+            self.deluxscore_max,
+        )
+
+    def merge_best(self, other):
+        """择优合并达成率、FC 与 FS，不包括 DX 分数"""
+        if other.achievement > self.achievement:
+            self.achievement = other.achievement
+        if AQUA_COMBO_RANK.get(other.combo_status, 0) > AQUA_COMBO_RANK.get(
+            self.combo_status, 0
+        ):
+            self.combo_status = other.combo_status
+        if AQUA_SYNC_RANK.get(other.sync_status, 0) > AQUA_SYNC_RANK.get(
+            self.sync_status, 0
+        ):
+            self.sync_status = other.sync_status
+
+    def insert_params(self):
+        return (
+            self.id,
+            self.music_id,
+            self.level,
+            self.play_count,
+            self.achievement,
+            self.combo_status,
+            self.sync_status,
+            self.deluxscore_max,
+            self.score_rank,
+            self.user_id,
+            self.ext_num1,
+        )
+
+    def update_params(self):
+        return (
+            self.play_count,
+            self.achievement,
+            self.combo_status,
+            self.sync_status,
+            self.deluxscore_max,
+            self.score_rank,
+            self.ext_num1,
+            self.id,
+            self.user_id,
+        )
+
+
+def from_diving_fish_records(records):
+    """批量将 diving-fish 格式的成绩转换为 ChartScore"""
+    achievements = to_aqua_achievements([record["achievements"] for record in records])
+    combo_status = to_aqua_combo_status([record["fc"] for record in records])
+    sync_status = to_aqua_sync_status([record["fs"] for record in records])
+    return [
+        ChartScore(
+            record["song_id"],
+            record["level_index"],
+            achievement,
+            fc,
+            fs,
+            record["dxScore"],
+        )
+        for record, achievement, fc, fs in zip(
+            records, achievements, combo_status, sync_status
+        )
+    ]
+
+
+def from_aqua_rows(rows):
+    """由 (music_id, level, achievement, combo_status, sync_status, deluxscore_max) 行创建 ChartScore"""
+    return [ChartScore(*row) for row in rows]
+
+
+def to_diving_fish_records(scores, music_catalog):
+    """批量转换为上传 diving-fish 所需的成绩，跳过 music_data 中没有的歌曲"""
+    scores = [score for score in scores if score.music_id in music_catalog]
+    achievements = to_diving_fish_achievements([score.achievement for score in scores])
+    combo_status = to_diving_fish_combo_status([score.combo_status for score in scores])
+    sync_status = to_diving_fish_sync_status([score.sync_status for score in scores])
+
+    records = []
+    for score, achievement, fc, fs in zip(
+        scores, achievements, combo_status, sync_status
+    ):
+        music_detail = music_catalog.get_by_id(score.music_id)
+        records.append(
+            {
+                "achievements": achievement,
+                "dxScore": score.deluxscore_max,
+                "fc": fc,
+                "fs": fs,
+                "level_index": score.level,
+                "title": music_detail["title"],
+                "type": music_detail["type"],
+            }
+        )
+    return records
@@ -0,0 +1,132 @@
+import hashlib
+import json
+import os
+import time
+from tqdm import tqdm
+from .init_config import (
+    DEFAULT_UPLOAD_CHUNK_SIZE,
+    DEFAULT_UPLOAD_MAX_RETRIES,
+    DEFAULT_UPLOAD_RETRY_BACKOFF,
+    UPLOAD_CHECKPOINT_FILE,
+    get_sidecar_path,
+)
+from .prober_transport import CircuitOpenError
+from .sync_state import account_key
+
+
+def records_digest(records):
+    payload = json.dumps(records, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+class UploadCheckpoint:
+    """分块上传的断点，记录同一批成绩已确认上传的块数
+
+    断点按成绩内容与分块大小识别，内容变化后会从头上传。
+    """
+
+    def __init__(self, path, upload_id, chunk_size):
+        self.path = path
+        self.upload_id = upload_id
+        self.chunk_size = chunk_size
+        self.confirmed_chunks = 0
+
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    saved = json.load(f)
+            except (OSError, ValueError):
+                saved = {}
+            if (
+                saved.get("upload_id") == upload_id
+                and saved.get("chunk_size") == chunk_size
+            ):
+                self.confirmed_chunks = saved.get("confirmed_chunks", 0)
+
+    @classmethod
+    def for_records(cls, config, records, path=None):
+        """按账号区分断点文件，批量同步多个账号时各自续传"""
+        chunk_size = config.get("upload_chunk_size", DEFAULT_UPLOAD_CHUNK_SIZE)
+        if path is None:
+            name, ext = os.path.splitext(UPLOAD_CHECKPOINT_FILE)
+            path = get_sidecar_path(f"{name}_{account_key(config)}{ext}")
+        return cls(
+            path,
+            records_digest(records),
+            chunk_size,
+        )
+
+    def confirm(self, chunk_index):
+        self.confirmed_chunks = chunk_index + 1
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "upload_id": self.upload_id,
+                    "chunk_size": self.chunk_size,
+                    "confirmed_chunks": self.confirmed_chunks,
+                },
+                f,
+            )
+        os.replace(temp_path, self.path)
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def upload_in_chunks(config, client, records, checkpoint):
+    """分块上传成绩，每块失败后按指数退避重试，并从断点继续
+
+    Args:
+        config (dict): adm_config.json 中的配置
+        client (ProberAPIClient): 已配置账号的客户端
+        records (list): 待上传的成绩
+        checkpoint (UploadCheckpoint): 本批成绩的上传断点
+
+    Returns:
+        dict: 最后一块的服务器响应
+    """
+    max_retries = config.get("upload_max_retries", DEFAULT_UPLOAD_MAX_RETRIES)
+    backoff = config.get("upload_retry_backoff", DEFAULT_UPLOAD_RETRY_BACKOFF)
+    chunk_size = checkpoint.chunk_size
+    chunks = [
+        records[start : start + chunk_size]
+        for start in range(0, len(records), chunk_size)
+    ] or [[]]
+
+    if checkpoint.confirmed_chunks:
+        print(
+            f"从断点继续上传，已完成 {checkpoint.confirmed_chunks}/{len(chunks)} 块。"
+        )
+
+    response = {"message": "更新成功"}
+    for chunk_index in tqdm(
+        range(checkpoint.confirmed_chunks, len(chunks)),
+        desc="上传成绩",
+        unit="chunk",
+    ):
+        for attempt in range(max_retries + 1):
+            try:
+                response = client.update_records(
+                    username=config["username"],
+                    password=config["password"],
+                    records=chunks[chunk_index],
+                    strict=True,
+                )
+                break
+            except RuntimeError as e:
+                # 熔断期间重试只会立即失败，直接保留断点退出
+                if attempt == max_retries or isinstance(e, CircuitOpenError):
+                    print(
+                        f"第 {chunk_index + 1} 块上传失败，已完成 {chunk_index}/{len(chunks)} 块，"
+                        "下次上传相同成绩时会从断点继续。"
+                    )
+                    raise
+                delay = backoff * 2**attempt
+                print(f"第 {chunk_index + 1} 块上传失败，{delay:.1f}s 后重试: {e}")
+                time.sleep(delay)
+        checkpoint.confirm(chunk_index)
+
+    checkpoint.clear()
+    return response
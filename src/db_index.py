@@ -0,0 +1,115 @@
+"""maimai2_user_music_detail 的索引检查
+
+用法: python -m src.db_index [--create | --drop] [--user-id N]
+"""
+
+import argparse
+from .aqua_db import get_connection
+from .aquadx_to_diving_fish import SELECT_USER_SCORES_SQL
+from .diving_fish_to_aquadx import (
+    DELETE_USER_SCORES_SQL,
+    SELECT_EXISTING_SCORES_SQL,
+    UPDATE_SQL,
+)
+from .init_config import load_config
+
+INDEX_NAME = "adm_user_music_detail_user_chart"
+INDEX_COLUMNS = ("user_id", "music_id", "level")
+
+CREATE_INDEX_SQL = f"""
+    CREATE INDEX IF NOT EXISTS {INDEX_NAME}
+    ON maimai2_user_music_detail ({", ".join(INDEX_COLUMNS)})
+"""
+
+
+def hot_queries(user_id=0):
+    """同步过程中频繁执行的查询及用于 EXPLAIN 的参数"""
+    return {
+        "fetch_aqua_sqlite": (SELECT_USER_SCORES_SQL, (user_id,)),
+        "load_user_scores": (SELECT_EXISTING_SCORES_SQL, (user_id,)),
+        "update_score": (UPDATE_SQL, (0,) * 8 + (user_id,)),
+        "delete_user_scores": (DELETE_USER_SCORES_SQL, (user_id,)),
+    }
+
+
+def find_user_chart_index(conn):
+    """查找以 user_id 开头的索引，没有时返回 None"""
+    for index in conn.execute("PRAGMA index_list(maimai2_user_music_detail)"):
+        index_name = index[1]
+        columns = [
+            column[2] for column in conn.execute(f'PRAGMA index_info("{index_name}")')
+        ]
+        if columns and columns[0] == "user_id":
+            return index_name
+    return None
+
+
+def create_index(conn):
+    with conn:
+        conn.execute(CREATE_INDEX_SQL)
+
+
+def drop_index(conn):
+    with conn:
+        conn.execute(f"DROP INDEX IF EXISTS {INDEX_NAME}")
+
+
+def explain_hot_queries(conn, user_id=0):
+    """返回各热点查询的 EXPLAIN QUERY PLAN 结果"""
+    return {
+        name: [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+        for name, (sql, params) in hot_queries(user_id).items()
+    }
+
+
+def print_query_plans(conn, user_id=0):
+    for name, details in explain_hot_queries(conn, user_id).items():
+        print(f"{name}:")
+        for detail in details:
+            print(f"    {detail}")
+
+
+def prepare_index(config, conn):
+    """同步前检查索引，按 db_index 配置或询问用户决定是否创建
+
+    Returns:
+        bool: 是否创建了仅本次使用、需要在结束时删除的索引
+    """
+    if find_user_chart_index(conn):
+        return False
+
+    mode = config.get("db_index", "ask")
+    if mode == "ask":
+        answer = input(
+            "maimai2_user_music_detail 缺少按 user_id 的索引，是否创建以加速同步？"
+            "(y: 创建 / t: 仅本次使用 / n: 不使用): "
+        ).lower()
+        mode = {"y": "create", "t": "temporary"}.get(answer, "off")
+
+    if mode in ("create", "temporary"):
+        create_index(conn)
+        print(f"已创建索引 {INDEX_NAME}。")
+    return mode == "temporary"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="检查 Aqua 数据库的成绩表索引")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--create", action="store_true", help="创建索引")
+    group.add_argument("--drop", action="store_true", help="删除本工具创建的索引")
+    parser.add_argument("--user-id", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    conn = get_connection(load_config())
+    if args.create:
+        create_index(conn)
+    elif args.drop:
+        drop_index(conn)
+
+    index_name = find_user_chart_index(conn)
+    print(f"索引: {index_name or '无'}")
+    print_query_plans(conn, args.user_id)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,30 +1,59 @@
-import json
+import threading
 import requests
 from requests.exceptions import RequestException
+from .json_stream import STREAM_CHUNK_SIZE, iter_json_array, iter_json_object_array
+from .init_config import DEFAULT_NETWORK_TIMEOUT
+from .instrumentation import count, counted_chunks, span, timed
+from .music_data_cache import load_music_data
+from .prober_transport import ProberTransport
+
+
+def count_request(response, *args, **kwargs):
+    """requests 的响应钩子，统计请求数与发送的字节数"""
+    count("http.requests")
+    body = response.request.body
+    count("http.bytes_sent", len(body) if body else 0)
 
 
 class ProberAPIClient:
-    def __init__(self):
+    def __init__(
+        self, session=None, network_timeout=DEFAULT_NETWORK_TIMEOUT, transport=None
+    ):
         self.username = ""
         self.password = ""
-        self.network_timeout = 10
-        self.client = requests.Session()
+        self.network_timeout = network_timeout
+        self.client = session or requests.Session()
+        self.client.hooks["response"].append(count_request)
+        # 所有请求经由 transport 发送，超时、重试、限速与熔断都在其中处理
+        self.transport = transport or ProberTransport(self.client, network_timeout)
         self.jwt = ""
         self.base_url = "https://www.diving-fish.com/api/maimaidxprober"
 
+    @classmethod
+    def from_config(cls, config, session=None):
+        session = session or requests.Session()
+        return cls(
+            session,
+            config.get("network_timeout", DEFAULT_NETWORK_TIMEOUT),
+            ProberTransport.from_config(session, config),
+        )
+
+    @timed("prober.login")
     def login(self):
         body = {"username": self.username, "password": self.password}
 
         try:
-            response = self.client.post(
+            response = self.transport.request(
+                "POST",
                 f"{self.base_url}/login",
                 headers={"Content-Type": "application/json"},
                 json=body,
-                timeout=self.network_timeout,
             )
         except RequestException as e:
             raise RuntimeError("登录失败: {}".format(e))
 
+        if response.status_code >= 500:
+            raise RuntimeError(f"登录失败: 服务器返回 {response.status_code}")
         if response.status_code != 200:
             raise ValueError("登录凭据错误")
 
@@ -48,6 +77,13 @@ class ProberAPIClient:
             f"请求失败: {exception}, 状态码: {status_code}, URL: {url}, message: {message}"
         )
 
+    def handle_stream_exception(self, response, exception):
+        """读取流式响应体时连接中断或内容不完整，响应体已被部分读取，不再解析 message"""
+        raise RuntimeError(
+            f"读取响应失败: {exception}, 状态码: {response.status_code}, URL: {response.url}"
+        )
+
+    @timed("prober.player_records")
     def get_player_full_scores(self, username, password):
         if not self.jwt:
             self.username = username
@@ -56,8 +92,9 @@ class ProberAPIClient:
 
         url = f"{self.base_url}/player/records"
 
+        response = None
         try:
-            response = self.client.get(url)
+            response = self.transport.request("GET", url)
             response.raise_for_status()
         except RequestException as e:
             try:
@@ -66,12 +103,49 @@ class ProberAPIClient:
                 message = "Unknown error"
             raise RuntimeError(f"GET 请求失败: {e}, message: {message}")
 
+        count("http.bytes_received", len(response.content))
         return response.json()
 
+    def iter_player_records(self, username, password, meta=None):
+        """流式获取玩家成绩，边下载边逐条产出 records 中的成绩
+
+        Args:
+            username (str): diving-fish 用户名
+            password (str): diving-fish 密码
+            meta (dict, optional): 用于接收响应中 records 以外字段的字典. Defaults to None.
+        """
+        if not self.jwt:
+            self.username = username
+            self.password = password
+            self.login()
+
+        url = f"{self.base_url}/player/records"
+
+        response = None
+        try:
+            # 只统计到收到响应头为止，读取响应体的耗时计入调用方的阶段
+            with span("prober.player_records"):
+                response = self.transport.request("GET", url, stream=True)
+            response.raise_for_status()
+        except RequestException as e:
+            self.handle_request_exception(response, e)
+
+        with response:
+            try:
+                yield from iter_json_object_array(
+                    counted_chunks(response.iter_content(STREAM_CHUNK_SIZE)),
+                    "records",
+                    meta,
+                )
+            except (RequestException, ValueError) as e:
+                self.handle_stream_exception(response, e)
+
+    @timed("prober.music_data")
     def get_music_data(self):
         url = f"{self.base_url}/music_data"
+        response = None
         try:
-            response = self.client.get(url)
+            response = self.transport.request("GET", url)
             response.raise_for_status()
         except RequestException as e:
             try:
@@ -80,9 +154,63 @@ class ProberAPIClient:
                 message = "Unknown error"
             raise RuntimeError(f"GET 请求失败: {e}, message: {message}")
 
+        count("http.bytes_received", len(response.content))
         return response.json()
 
-    def update_records(self, username, password, records):
+    @timed("prober.music_data")
+    def fetch_music_data(self, etag="", last_modified=""):
+        """带条件请求地获取 music_data
+
+        Args:
+            etag (str, optional): 上次响应的 ETag. Defaults to "".
+            last_modified (str, optional): 上次响应的 Last-Modified. Defaults to "".
+
+        Returns:
+            tuple: (music_data, etag, last_modified)，未修改时 music_data 为 None
+        """
+        url = f"{self.base_url}/music_data"
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+
+        response = None
+        try:
+            response = self.transport.request("GET", url, headers=headers, stream=True)
+            response.raise_for_status()
+        except RequestException as e:
+            self.handle_request_exception(response, e)
+
+        with response:
+            if response.status_code == 304:
+                return None, etag, last_modified
+
+            try:
+                music_data = list(
+                    iter_json_array(
+                        counted_chunks(response.iter_content(STREAM_CHUNK_SIZE))
+                    )
+                )
+            except (RequestException, ValueError) as e:
+                self.handle_stream_exception(response, e)
+
+            return (
+                music_data,
+                response.headers.get("ETag", ""),
+                response.headers.get("Last-Modified", ""),
+            )
+
+    @timed("prober.update_records")
+    def update_records(self, username, password, records, strict=False):
+        """上传成绩
+
+        Args:
+            username (str): diving-fish 用户名
+            password (str): diving-fish 密码
+            records (list): 待上传的成绩
+            strict (bool, optional): 服务器返回500时是否抛出异常而不是视为成功. Defaults to False.
+        """
         if not self.jwt:
             self.username = username
             self.password = password
@@ -91,16 +219,14 @@ class ProberAPIClient:
         url = f"{self.base_url}/player/update_records"
         headers = {"Content-Type": "application/json"}
 
+        response = None
         try:
-            response = self.client.post(
-                url,
-                headers=headers,
-                json=records,
-                timeout=self.network_timeout,
+            response = self.transport.request(
+                "POST", url, headers=headers, json=records
             )
             response.raise_for_status()
         except requests.exceptions.HTTPError as e:
-            if response.status_code == 500:
+            if response.status_code == 500 and not strict:
                 print("服务器返回500错误，这可能不影响上传进行，请稍后手动检查。")
                 return {
                     "status": "success",
@@ -111,18 +237,21 @@ class ProberAPIClient:
         except RequestException as e:
             self.handle_request_exception(response, e)
 
+        count("http.bytes_received", len(response.content))
         return response.json()
 
+    @timed("prober.delete_records")
     def delete_player_records(self, username, password):
         if not self.jwt:
             self.username = username
             self.password = password
             self.login()
 
-        url = "https://www.diving-fish.com/api/maimaidxprober/player/delete_records"
+        url = f"{self.base_url}/player/delete_records"
 
+        response = None
         try:
-            response = self.client.delete(url)
+            response = self.transport.request("DELETE", url)
             response.raise_for_status()
         except RequestException as e:
             self.handle_request_exception(response, e)
@@ -130,17 +259,41 @@ class ProberAPIClient:
         return response.json()
 
 
-with open("adm_config.json", "r", encoding="utf-8") as file:
-    config = json.load(file)
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(config):
+    """返回 config 中账号共享的 ProberAPIClient，首次使用时才创建
 
-client = ProberAPIClient()
+    每个 diving-fish 账号各有一个客户端，批量同步时多个账号互不影响登录状态。
+    """
+    username = config["username"]
+    with _clients_lock:
+        client = _clients.get(username)
+        if client is None:
+            client = _clients[username] = ProberAPIClient.from_config(config)
+            client.username = username
+            client.password = config["password"]
+    return client
 
 
-def get_player_scores():
-    full_scores = client.get_player_full_scores(config["username"], config["password"])
+def get_player_scores(config):
+    full_scores = get_client(config).get_player_full_scores(
+        config["username"], config["password"]
+    )
     return full_scores
 
 
-def get_music_data():
-    music_data = client.get_music_data()
+def stream_player_scores(config):
+    """与 get_player_scores 相同，但 records 为边下载边解析的生成器"""
+    payload = {}
+    payload["records"] = get_client(config).iter_player_records(
+        config["username"], config["password"], meta=payload
+    )
+    return payload
+
+
+def get_music_data(config):
+    music_data = load_music_data(get_client(config), ttl=config.get("music_data_ttl"))
     return music_data
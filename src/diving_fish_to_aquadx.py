@@ -1,197 +1,289 @@
-import json
-import sqlite3
+import time
 from tqdm import tqdm
+from .chart_score import ChartScore, from_diving_fish_records
+from .aqua_db import get_connection
+from .instrumentation import span, timed
+from .pipeline import iter_batches, pipeline
+from .score_merge import hash_join
+from .sync_state import DOWNLOAD, SyncStateJournal, account_key, content_hash
 
-with open("adm_config.json", "r") as f:
-    config = json.load(f)
-
-aqua_path = config["aqua_path"]
-db_path = f"{aqua_path}/data/db.sqlite"
-
-
-class song_score:
-    def __init__(
-        self,
-        id,
-        music_id,
-        level,
-        play_count,
-        achievement,
-        combo_status,
-        sync_status,
-        deluxscore_max,
-        score_rank,
-        user_id,
-        ext_num1,
-    ):
-        self.id = id
-        self.music_id = music_id
-        self.level = level
-        self.play_count = play_count
-        self.achievement = achievement
-        self.combo_status = combo_status
-        self.sync_status = sync_status
-        self.deluxscore_max = deluxscore_max
-        self.score_rank = score_rank
-        self.user_id = user_id
-        self.ext_num1 = ext_num1
-
-    def insert_into_db(self, conn):
-        cursor = conn.cursor()
-        cursor.execute(
-            """
-            INSERT INTO maimai2_user_music_detail (
-                id, music_id, level, play_count, achievement, combo_status, 
-                sync_status, deluxscore_max, score_rank, user_id, ext_num1
-            ) 
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """,
-            (
-                self.id,
-                self.music_id,
-                self.level,
-                self.play_count,
-                self.achievement,
-                self.combo_status,
-                self.sync_status,
-                self.deluxscore_max,
-                self.score_rank,
-                self.user_id,
-                self.ext_num1,
-            ),
-        )
-        conn.commit()
-
-    def update_in_db(self, conn):
-        cursor = conn.cursor()
-        cursor.execute(
-            """
-            UPDATE maimai2_user_music_detail
-            SET play_count = ?, achievement = ?, combo_status = ?, 
-                sync_status = ?, deluxscore_max = ?, score_rank = ?, 
-                user_id = ?, ext_num1 = ?
-            WHERE music_id = ? AND level = ?
-            """,
-            (
-                self.play_count,
-                self.achievement,
-                self.combo_status,
-                self.sync_status,
-                self.deluxscore_max,
-                self.score_rank,
-                self.user_id,
-                self.ext_num1,
-                self.music_id,
-                self.level,
-            ),
+WRITE_BATCH_SIZE = 1000
+
+INSERT_SQL = """
+    INSERT INTO maimai2_user_music_detail (
+        id, music_id, level, play_count, achievement, combo_status,
+        sync_status, deluxscore_max, score_rank, user_id, ext_num1
+    )
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+UPDATE_SQL = """
+    UPDATE maimai2_user_music_detail
+    SET play_count = ?, achievement = ?, combo_status = ?,
+        sync_status = ?, deluxscore_max = ?, score_rank = ?, ext_num1 = ?
+    WHERE id = ? AND user_id = ?
+"""
+
+SELECT_EXISTING_SCORES_SQL = """
+    SELECT id, music_id, level, play_count, achievement, combo_status,
+           sync_status, deluxscore_max, score_rank, ext_num1
+    FROM maimai2_user_music_detail
+    WHERE user_id = ?
+"""
+
+DELETE_USER_SCORES_SQL = "DELETE FROM maimai2_user_music_detail WHERE user_id = ?"
+
+# 下载的成绩先写入连接私有的临时表，不会对 db.sqlite 加锁
+STAGE_TABLE = "temp.adm_download_stage"
+STAGE_KEEP = 0
+STAGE_INSERT = 1
+STAGE_UPDATE = 2
+
+CREATE_STAGE_SQL = f"""
+    CREATE TABLE IF NOT EXISTS {STAGE_TABLE} (
+        music_id INTEGER, level INTEGER, action INTEGER, id INTEGER,
+        play_count INTEGER, achievement INTEGER, combo_status INTEGER,
+        sync_status INTEGER, deluxscore_max INTEGER, score_rank INTEGER,
+        ext_num1 INTEGER, content_hash TEXT,
+        PRIMARY KEY (music_id, level)
+    )
+"""
+
+STAGE_INSERT_SQL = f"""
+    INSERT OR REPLACE INTO {STAGE_TABLE}
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+# 新成绩的 id 从 MAX(id) + 1 起按下载顺序连续分配
+APPLY_INSERTS_SQL = f"""
+    INSERT INTO maimai2_user_music_detail (
+        id, music_id, level, play_count, achievement, combo_status,
+        sync_status, deluxscore_max, score_rank, user_id, ext_num1
+    )
+    SELECT ? + ROW_NUMBER() OVER (ORDER BY rowid), music_id, level, play_count, achievement, combo_status,
+           sync_status, deluxscore_max, score_rank, ?, ext_num1
+    FROM {STAGE_TABLE}
+    WHERE action = {STAGE_INSERT}
+"""
+
+APPLY_UPDATES_SQL = f"""
+    UPDATE maimai2_user_music_detail AS d
+    SET play_count = s.play_count, achievement = s.achievement,
+        combo_status = s.combo_status, sync_status = s.sync_status,
+        deluxscore_max = s.deluxscore_max, score_rank = s.score_rank,
+        ext_num1 = s.ext_num1
+    FROM {STAGE_TABLE} AS s
+    WHERE s.action = {STAGE_UPDATE} AND d.id = s.id AND d.user_id = ?
+"""
+
+SELECT_STAGED_STATE_SQL = f"""
+    SELECT music_id, level, content_hash,
+           achievement, combo_status, sync_status, deluxscore_max
+    FROM {STAGE_TABLE}
+"""
+
+
+def merge_chart_score(score, new_score):
+    """将 diving-fish 成绩择优合并进已有的成绩"""
+    score.merge_best(new_score)
+    score.deluxscore_max = max(new_score.deluxscore_max, score.deluxscore_max)
+
+
+@timed("download.load_existing")
+def load_user_scores(conn, user_id):
+    """一次性读取用户已有成绩，按 (music_id, level) 建立索引"""
+    cursor = conn.execute(SELECT_EXISTING_SCORES_SQL, (user_id,))
+    existing_scores = {}
+    for row in cursor.fetchall():
+        score = ChartScore(
+            music_id=row[1],
+            level=row[2],
+            achievement=row[4],
+            combo_status=row[5],
+            sync_status=row[6],
+            deluxscore_max=row[7],
+            id=row[0],
+            play_count=row[3],
+            score_rank=row[8],
+            user_id=user_id,
+            ext_num1=row[9],
         )
-        conn.commit()
+        existing_scores[score.key] = score
+    return existing_scores
 
 
-def parse_combo_status(fc_value):
-    switcher = {"fc": 1, "fcp": 2, "ap": 3, "app": 4}
-    return switcher.get(fc_value, 0)
+@timed("download.write")
+def write_scores(conn, new_scores, updated_scores):
+    """批量写入待新增与待更新的成绩，并清空两个待写字典"""
+    conn.executemany(
+        INSERT_SQL, [score.insert_params() for score in new_scores.values()]
+    )
+    conn.executemany(
+        UPDATE_SQL, [score.update_params() for score in updated_scores.values()]
+    )
+    new_scores.clear()
+    updated_scores.clear()
 
 
-def parse_sync_status(fs_value):
-    switcher = {"sync": 5, "fs": 1, "fsp": 2, "fsd": 3, "fsdp": 4}
-    return switcher.get(fs_value, 0)
+def stage_row(action, score, digest):
+    return (
+        score.music_id,
+        score.level,
+        action,
+        score.id,
+        score.play_count,
+        score.achievement,
+        score.combo_status,
+        score.sync_status,
+        score.deluxscore_max,
+        score.score_rank,
+        score.ext_num1,
+        digest,
+    )
 
 
-def parse_achievements(achievements):
-    parsed_achievements = int(10000 * achievements)
-    return parsed_achievements
+@timed("download.stage")
+def stage_scores(conn, staged_rows):
+    """将一批成绩写入暂存表并清空 staged_rows，事务只涉及临时库"""
+    with conn:
+        conn.executemany(STAGE_INSERT_SQL, staged_rows)
+    staged_rows.clear()
 
 
-def save_player_scores(payload: dict, user_id, overwrite: bool = False):
+def iter_chart_scores(records, batch_size=WRITE_BATCH_SIZE):
+    """将流式到达的 diving-fish 成绩按批转换为 ChartScore
+
+    下载解析与转换各在一个线程中进行，调用方所在线程只负责写入暂存表，
+    三者通过有界队列重叠执行。
+    """
+    for scores in pipeline(
+        iter_batches(records, batch_size),
+        timed("download.convert")(from_diving_fish_records),
+    ):
+        yield from scores
+
+
+def filter_changed_scores(scores, existing_scores, sync_state):
+    """跳过 diving-fish 成绩与本地成绩都和上次同步时一致的谱面"""
+    for new_score in scores:
+        key = new_score.key
+        last_state = sync_state.get(key)
+        score = existing_scores.get(key)
+        if (
+            last_state is not None
+            and score is not None
+            and last_state[0] == content_hash(new_score.score_values())
+            and last_state[1] == score.score_values()
+        ):
+            continue
+        yield new_score
+
+
+@timed("download.total")
+def save_player_scores(
+    config, payload: dict, user_id, overwrite: bool = False, incremental: bool = True
+):
     """_summary_
 
     Args:
+        config (dict): adm_config.json 中的配置
         payload (dict): 用户成绩字典
         user_id (int): 用于指示 db.sqlite 中的用户
         overwrite (bool): 是否覆写（否则择优）
+        incremental (bool): 是否只处理上次同步后变化的谱面
+
+    Returns:
+        dict: 新增、更新条数与写入耗时
     """
 
     data = payload
-    conn = sqlite3.connect(db_path)
+    start_time = time.perf_counter()
+    conn = get_connection(config)
+    journal = SyncStateJournal()
+    account = account_key(config)
 
-    if overwrite:
-        # 清除数据库 maimai2_user_music_detail 表中的内容
-        cursor = conn.cursor()
-        cursor.execute(
-            "DELETE FROM maimai2_user_music_detail WHERE user_id = ?", (user_id,)
+    try:
+        if overwrite:
+            existing_scores = {}
+        else:
+            # fetchall 后读事务随即结束，下载期间不持有 Aqua 数据库的锁
+            existing_scores = load_user_scores(conn, user_id)
+        with conn:
+            conn.execute(CREATE_STAGE_SQL)
+            conn.execute(f"DELETE FROM {STAGE_TABLE}")
+
+        scores = iter_chart_scores(
+            tqdm(data["records"], desc="保存玩家成绩", unit="record")
         )
-        conn.commit()
-
-    with tqdm(total=len(data["records"]), desc="保存玩家成绩", unit="record") as pbar:
-        for record in data["records"]:
-            cursor = conn.cursor()
-            cursor.execute(
-                """
-                SELECT id, achievement, deluxscore_max, play_count, combo_status, sync_status FROM maimai2_user_music_detail 
-                WHERE music_id = ? AND level = ? AND user_id = ?
-                """,
-                (record["song_id"], record["level_index"], user_id),
+        if incremental and not overwrite:
+            scores = filter_changed_scores(
+                scores, existing_scores, journal.load(user_id, account, DOWNLOAD)
             )
-            existing_score = cursor.fetchone()
-
-            if existing_score and not overwrite:
-                (
-                    existing_id,
-                    existing_achievement,
-                    existing_deluxscore_max,
-                    existing_play_count,
-                    existing_combo_status,
-                    existing_sync_status,
-                ) = existing_score
-
-                new_achievement = parse_achievements(record["achievements"])
-                new_combo_status = parse_combo_status(record["fc"])
-                new_sync_status = parse_sync_status(record["fs"])
-                new_deluxscore_max = record["dxScore"]
-
-                score = song_score(
-                    id=existing_id,
-                    music_id=record["song_id"],
-                    level=record["level_index"],
-                    play_count=existing_play_count,
-                    achievement=max(new_achievement, existing_achievement),
-                    combo_status=max(new_combo_status, existing_combo_status),
-                    sync_status=max(
-                        new_sync_status,
-                        existing_sync_status,
-                        key=lambda x: (x == 5, x),
-                    ),
-                    deluxscore_max=max(new_deluxscore_max, existing_deluxscore_max),
-                    score_rank=0,
-                    user_id=user_id,
-                    ext_num1=0,
-                )
-
-                score.update_in_db(conn)
+
+        staged_rows = []
+        updated_keys = set()
+        for key, score, new_score in hash_join(
+            existing_scores, scores, key=lambda new_score: new_score.key
+        ):
+            digest = content_hash(new_score.score_values())
+            if score is None:
+                # diving-fish 中每个谱面只有一条成绩，新谱面不放入索引，内存占用不随下载增长
+                staged_rows.append(stage_row(STAGE_INSERT, new_score, digest))
             else:
-                cursor.execute(
-                    """
-                    SELECT MAX(id) FROM maimai2_user_music_detail
-                    """
-                )
-                max_id = cursor.fetchone()[0]
-                new_id = (max_id + 1) if max_id is not None else 1
-                score = song_score(
-                    id=new_id,
-                    music_id=record["song_id"],
-                    level=record["level_index"],
-                    play_count=1,
-                    achievement=parse_achievements(record["achievements"]),
-                    combo_status=parse_combo_status(record["fc"]),
-                    sync_status=parse_sync_status(record["fs"]),
-                    deluxscore_max=record["dxScore"],
-                    score_rank=0,
-                    user_id=user_id,
-                    ext_num1=0,
-                )
-                score.insert_into_db(conn)
-
-            pbar.update(1)
-
-    conn.close()
+                previous_values = score.score_values()
+                merge_chart_score(score, new_score)
+                if score.score_values() != previous_values:
+                    score.score_rank = 0
+                    score.ext_num1 = 0
+                    updated_keys.add(key)
+                action = STAGE_UPDATE if key in updated_keys else STAGE_KEEP
+                staged_rows.append(stage_row(action, score, digest))
+
+            # 成绩流式到达时分批写入暂存表，使写入与下载重叠
+            if len(staged_rows) >= WRITE_BATCH_SIZE:
+                stage_scores(conn, staged_rows)
+        stage_scores(conn, staged_rows)
+
+        # 下载完成后才在一个短事务中清除旧成绩并写入 Aqua 数据库，只提交一次
+        with span("download.write"), conn:
+            if overwrite:
+                # 清除数据库 maimai2_user_music_detail 表中的内容
+                conn.execute(DELETE_USER_SCORES_SQL, (user_id,))
+            max_id = conn.execute(
+                "SELECT MAX(id) FROM maimai2_user_music_detail"
+            ).fetchone()[0]
+            inserted = conn.execute(APPLY_INSERTS_SQL, (max_id or 0, user_id)).rowcount
+            updated = conn.execute(APPLY_UPDATES_SQL, (user_id,)).rowcount
+
+        # 写入成功后再记录同步状态
+        if overwrite:
+            journal.reset(user_id, account, DOWNLOAD)
+        with span("download.journal"):
+            journal.record(
+                user_id,
+                account,
+                DOWNLOAD,
+                [
+                    ((row[0], row[1]), row[2], tuple(row[3:]))
+                    for row in conn.execute(SELECT_STAGED_STATE_SQL)
+                ],
+            )
+        with conn:
+            conn.execute(f"DELETE FROM {STAGE_TABLE}")
+    finally:
+        journal.close()
+
+    elapsed = time.perf_counter() - start_time
+    written = inserted + updated
+    rows_per_sec = written / elapsed if elapsed > 0 else 0.0
+    print(
+        f"写入 {written} 条成绩 (新增 {inserted}，更新 {updated})，"
+        f"耗时 {elapsed:.2f}s，{rows_per_sec:.0f} 条/秒"
+    )
+
+    return {
+        "inserted": inserted,
+        "updated": updated,
+        "elapsed": elapsed,
+        "rows_per_sec": rows_per_sec,
+    }
@@ -3,6 +3,35 @@ import json
 
 CONFIG_FILE = "adm_config.json"
 README_FILE = "README.txt"
+MUSIC_DATA_CACHE_FILE = "music_data_cache.json"
+SYNC_STATE_FILE = "sync_state.sqlite"
+UPLOAD_CHECKPOINT_FILE = "upload_checkpoint.json"
+DEFAULT_MUSIC_DATA_TTL = 86400
+DEFAULT_UPLOAD_CHUNK_SIZE = 500
+DEFAULT_UPLOAD_MAX_RETRIES = 3
+DEFAULT_UPLOAD_RETRY_BACKOFF = 1.0
+DEFAULT_NETWORK_TIMEOUT = 10
+DEFAULT_PROBER_CONCURRENCY = 4
+DEFAULT_NETWORK_MAX_RETRIES = 3
+DEFAULT_NETWORK_RETRY_BACKOFF = 0.5
+DEFAULT_PROBER_RATE_LIMIT = 5.0
+DEFAULT_BREAKER_THRESHOLD = 5
+DEFAULT_BREAKER_RESET_TIMEOUT = 30.0
+
+
+def load_config(config_file=CONFIG_FILE):
+    with open(config_file, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def get_db_path(config):
+    return os.path.join(config["aqua_path"], "data", "db.sqlite")
+
+
+def get_sidecar_path(file_name):
+    """adm_config.json 同目录下的附属文件路径"""
+    config_dir = os.path.dirname(os.path.abspath(CONFIG_FILE))
+    return os.path.join(config_dir, file_name)
 
 
 def create_readme_if_not_exists():
@@ -33,7 +62,13 @@ aqua 路径的填写需要注意以下几点：
 
 def create_adm_config_if_not_exists():
     if not os.path.exists(CONFIG_FILE):
-        config_data = {"username": "", "password": "", "aqua_path": ""}
+        config_data = {
+            "username": "",
+            "password": "",
+            "aqua_path": "",
+            "music_data_ttl": DEFAULT_MUSIC_DATA_TTL,
+            "upload_chunk_size": DEFAULT_UPLOAD_CHUNK_SIZE,
+        }
         with open(CONFIG_FILE, "w", encoding="utf-8") as f:
             json.dump(config_data, f, ensure_ascii=False, indent=4)
         print(f"已创建默认配置文件 {CONFIG_FILE}。初次运行，请先填写相关信息。")
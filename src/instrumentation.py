@@ -0,0 +1,84 @@
+"""同步各阶段的耗时与计数统计
+
+阶段耗时按名称累计，多个线程中同时进行的阶段会分别计入，总和可能超过实际耗时。
+"""
+
+import contextlib
+import functools
+import threading
+import time
+
+_lock = threading.Lock()
+_spans = {}
+_counters = {}
+
+
+@contextlib.contextmanager
+def span(name):
+    """统计 with 块的耗时，计入名为 name 的阶段"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        with _lock:
+            calls, total = _spans.get(name, (0, 0.0))
+            _spans[name] = (calls + 1, total + elapsed)
+
+
+def timed(name):
+    """将函数的每次调用计入名为 name 的阶段"""
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def count(name, value=1):
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def counted_chunks(chunks, name="http.bytes_received"):
+    """边产出边统计流式响应的字节数"""
+    for chunk in chunks:
+        count(name, len(chunk))
+        yield chunk
+
+
+def snapshot():
+    with _lock:
+        return {
+            "spans": {
+                name: {"calls": calls, "seconds": total}
+                for name, (calls, total) in _spans.items()
+            },
+            "counters": dict(_counters),
+        }
+
+
+def reset():
+    with _lock:
+        _spans.clear()
+        _counters.clear()
+
+
+def print_summary():
+    """打印各阶段耗时与计数"""
+    stats = snapshot()
+    if not stats["spans"] and not stats["counters"]:
+        return
+
+    print(f"{'阶段':<28}{'次数':>6}{'耗时(s)':>10}")
+    for name, span_stats in sorted(
+        stats["spans"].items(), key=lambda item: -item[1]["seconds"]
+    ):
+        print(f"{name:<30}{span_stats['calls']:>8}{span_stats['seconds']:>12.3f}")
+    for name, value in sorted(stats["counters"].items()):
+        print(f"{name:<30}{value:>20}")
@@ -0,0 +1,118 @@
+import codecs
+import json
+
+STREAM_CHUNK_SIZE = 64 * 1024
+WHITESPACE = " \t\n\r"
+# 数字与 true/false/null 之后只能出现这些字符
+VALUE_DELIMITERS = WHITESPACE + ",:]}"
+
+
+class JSONStreamReader:
+    """从分块到达的字节流中逐个解析 JSON 值，不需要先读入完整响应"""
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.decoder = codecs.getincrementaldecoder("utf-8")()
+        self.json_decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        """读入下一块数据，已到达末尾时返回 False"""
+        if self.eof:
+            return False
+        # 丢弃已解析的部分，避免缓冲区随响应大小增长
+        self.buffer = self.buffer[self.pos :]
+        self.pos = 0
+        for chunk in self.chunks:
+            text = self.decoder.decode(chunk)
+            if text:
+                self.buffer += text
+                return True
+        self.buffer += self.decoder.decode(b"", final=True)
+        self.eof = True
+        return False
+
+    def peek(self):
+        """跳过空白并返回下一个字符，已到达末尾时返回空字符串"""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                return ""
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"JSON 格式错误: 期望 {char!r}，位置 {self.pos}")
+        self.pos += 1
+
+    def read_value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.json_decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self.fill():
+                    raise
+                continue
+            # 数字等值可能恰好在块边界处被截断（如 "0." 会被解析为 0），
+            # 需确认其后是分隔符
+            if (
+                not isinstance(value, (str, list, dict))
+                and (
+                    end == len(self.buffer) or self.buffer[end] not in VALUE_DELIMITERS
+                )
+                and self.fill()
+            ):
+                continue
+            self.pos = end
+            return value
+
+    def iter_array(self):
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield self.read_value()
+            if self.peek() == ",":
+                self.pos += 1
+                continue
+            self.expect("]")
+            return
+
+
+def iter_json_array(chunks):
+    """逐个产出顶层 JSON 数组中的元素"""
+    yield from JSONStreamReader(chunks).iter_array()
+
+
+def iter_json_object_array(chunks, key, meta=None):
+    """逐个产出顶层 JSON 对象中 key 对应数组的元素
+
+    Args:
+        chunks (iterable): 响应的字节块
+        key (str): 需要流式解析的数组字段
+        meta (dict, optional): 用于接收对象中其余字段的字典. Defaults to None.
+    """
+    reader = JSONStreamReader(chunks)
+    reader.expect("{")
+    if reader.peek() == "}":
+        return
+    while True:
+        name = reader.read_value()
+        reader.expect(":")
+        if name == key:
+            yield from reader.iter_array()
+        else:
+            value = reader.read_value()
+            if meta is not None:
+                meta[name] = value
+        if reader.peek() == ",":
+            reader.pos += 1
+            continue
+        reader.expect("}")
+        return
@@ -0,0 +1,29 @@
+class MusicCatalog:
+    """diving-fish music_data 的索引，按 id、title 和 (title, type) 查询均为 O(1)"""
+
+    def __init__(self, music_data):
+        self.music_data = music_data
+        self.by_id = {}
+        self.by_title = {}
+        self.by_title_type = {}
+
+        for music in music_data:
+            self.by_id[int(music["id"])] = music
+            # 同名歌曲保留第一条，与原先线性查找的行为一致
+            self.by_title.setdefault(music["title"], music)
+            self.by_title_type.setdefault((music["title"], music["type"]), music)
+
+    def __len__(self):
+        return len(self.music_data)
+
+    def __contains__(self, song_id):
+        return song_id in self.by_id
+
+    def get_by_id(self, song_id):
+        return self.by_id.get(int(song_id))
+
+    def get_by_title(self, title):
+        return self.by_title.get(title)
+
+    def get_by_title_type(self, title, music_type):
+        return self.by_title_type.get((title, music_type))
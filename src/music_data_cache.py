@@ -0,0 +1,74 @@
+import json
+import os
+import time
+from .init_config import (
+    DEFAULT_MUSIC_DATA_TTL,
+    MUSIC_DATA_CACHE_FILE,
+    get_sidecar_path,
+)
+
+
+def read_cache(cache_path):
+    if not os.path.exists(cache_path):
+        return None
+    try:
+        with open(cache_path, "r", encoding="utf-8") as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(cache.get("music_data"), list):
+        return None
+    return cache
+
+
+def write_cache(cache_path, cache):
+    # 先写临时文件再替换，避免中断时留下损坏的缓存
+    temp_path = f"{cache_path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(cache, f, ensure_ascii=False)
+    os.replace(temp_path, cache_path)
+
+
+def load_music_data(client, cache_path=None, ttl=None):
+    """读取本地缓存的 music_data，过期后通过条件请求重新验证
+
+    Args:
+        client (ProberAPIClient): 用于请求 music_data 的客户端
+        cache_path (str, optional): 缓存文件路径. Defaults to adm_config.json 同目录下的缓存文件.
+        ttl (int, optional): 缓存有效秒数，0 表示每次都重新验证. Defaults to DEFAULT_MUSIC_DATA_TTL.
+
+    Returns:
+        list: music_data
+    """
+    if cache_path is None:
+        cache_path = get_sidecar_path(MUSIC_DATA_CACHE_FILE)
+    if ttl is None:
+        ttl = DEFAULT_MUSIC_DATA_TTL
+
+    cache = read_cache(cache_path)
+    now = time.time()
+    if cache and now - cache.get("fetched_at", 0) < ttl:
+        return cache["music_data"]
+
+    try:
+        music_data, etag, last_modified = client.fetch_music_data(
+            etag=cache.get("etag", "") if cache else "",
+            last_modified=cache.get("last_modified", "") if cache else "",
+        )
+    except RuntimeError as e:
+        if cache is None:
+            raise
+        print(f"获取 music_data 失败，使用本地缓存: {e}")
+        return cache["music_data"]
+
+    if music_data is None:
+        cache["fetched_at"] = now
+    else:
+        cache = {
+            "etag": etag,
+            "last_modified": last_modified,
+            "fetched_at": now,
+            "music_data": music_data,
+        }
+    write_cache(cache_path, cache)
+    return cache["music_data"]
@@ -0,0 +1,109 @@
+import queue
+import threading
+from itertools import islice
+
+PIPELINE_QUEUE_SIZE = 4
+POLL_INTERVAL = 0.1
+
+_DONE = object()
+
+
+class _StageError:
+    def __init__(self, exception):
+        self.exception = exception
+
+
+def iter_batches(iterable, batch_size):
+    """将可迭代对象按 batch_size 切分为列表"""
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def _put(q, item, stop):
+    """放入队列，队列已满时等待；流水线被关闭时返回 False"""
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=POLL_INTERVAL)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _get(q, stop):
+    while not stop.is_set():
+        try:
+            return q.get(timeout=POLL_INTERVAL)
+        except queue.Empty:
+            continue
+    return _DONE
+
+
+def _produce(source, outbox, stop):
+    try:
+        for item in source:
+            if not _put(outbox, item, stop):
+                return
+    except BaseException as e:
+        _put(outbox, _StageError(e), stop)
+        return
+    _put(outbox, _DONE, stop)
+
+
+def _transform(stage, inbox, outbox, stop):
+    while True:
+        item = _get(inbox, stop)
+        if item is _DONE or isinstance(item, _StageError):
+            _put(outbox, item, stop)
+            return
+        try:
+            result = stage(item)
+        except BaseException as e:
+            _put(outbox, _StageError(e), stop)
+            return
+        if not _put(outbox, result, stop):
+            return
+
+
+def pipeline(source, *stages, maxsize=PIPELINE_QUEUE_SIZE):
+    """在独立线程中遍历 source 并依次执行各阶段，阶段之间以有界队列相连
+
+    调用方在当前线程中遍历返回的生成器，作为最后一个阶段（例如唯一的写库线程）。
+    队列已满时上游阶段会等待，内存中最多保留约 maxsize * (len(stages) + 1) 个元素。
+    任一阶段抛出的异常会在当前线程中重新抛出；提前停止遍历时各线程随之退出。
+
+    Args:
+        source (iterable): 第一个阶段遍历的数据，例如网络响应流
+        stages (callable): 依次作用于每个元素的函数，每个函数各占一个线程
+        maxsize (int, optional): 每个队列的容量. Defaults to PIPELINE_QUEUE_SIZE.
+    """
+    stop = threading.Event()
+    queues = [queue.Queue(maxsize) for _ in range(len(stages) + 1)]
+    threads = [
+        threading.Thread(target=_produce, args=(source, queues[0], stop), daemon=True)
+    ]
+    for stage, inbox, outbox in zip(stages, queues, queues[1:]):
+        threads.append(
+            threading.Thread(
+                target=_transform, args=(stage, inbox, outbox, stop), daemon=True
+            )
+        )
+    for thread in threads:
+        thread.start()
+
+    try:
+        while True:
+            item = queues[-1].get()
+            if item is _DONE:
+                return
+            if isinstance(item, _StageError):
+                raise item.exception
+            yield item
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
@@ -0,0 +1,199 @@
+"""diving-fish 请求的传输层：超时、带抖动的指数退避重试、限速与熔断
+
+限速器与熔断器在进程内所有账号的客户端之间共享，批量同步多个账号时
+总请求速率受限，服务器持续出错时所有请求快速失败，而不是各自长时间重试。
+"""
+
+import math
+import random
+import threading
+import time
+from requests.exceptions import ConnectionError, Timeout
+from .init_config import (
+    DEFAULT_BREAKER_RESET_TIMEOUT,
+    DEFAULT_BREAKER_THRESHOLD,
+    DEFAULT_NETWORK_MAX_RETRIES,
+    DEFAULT_NETWORK_RETRY_BACKOFF,
+    DEFAULT_NETWORK_TIMEOUT,
+    DEFAULT_PROBER_RATE_LIMIT,
+)
+from .instrumentation import count
+
+# 这些状态码表示服务器暂时不可用，可以重试
+RETRY_STATUS_CODES = frozenset({429, 502, 503, 504})
+MAX_RETRY_DELAY = 30.0
+
+
+class CircuitOpenError(RuntimeError):
+    pass
+
+
+class TokenBucket:
+    """令牌桶限速器，平均每秒 rate 个请求，允许 capacity 个请求的突发"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """取得一个令牌，令牌不足时等待"""
+        if self.rate <= 0:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.updated_at) * self.rate
+                )
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class CircuitBreaker:
+    """连续失败 failure_threshold 次后熔断，reset_timeout 秒后放行一次试探请求"""
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self.lock = threading.Lock()
+
+    def before_call(self):
+        with self.lock:
+            if self.opened_at is None:
+                return
+            remaining = self.opened_at + self.reset_timeout - time.monotonic()
+            if remaining > 0 or self.probing:
+                count("http.circuit_rejected")
+                raise CircuitOpenError(
+                    f"diving-fish 连续请求失败，已暂停请求，{math.ceil(max(remaining, 0))}s 后重试"
+                )
+            # 半开状态，只放行一个试探请求
+            self.probing = True
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.probing or self.failures >= self.failure_threshold:
+                if self.opened_at is None or self.probing:
+                    count("http.circuit_opened")
+                self.opened_at = time.monotonic()
+                self.probing = False
+
+
+_shared_lock = threading.Lock()
+_rate_limiter = None
+_circuit_breaker = None
+
+
+def get_shared_guards(config=None):
+    """返回进程内共享的限速器与熔断器，首次调用时按配置创建"""
+    global _rate_limiter, _circuit_breaker
+    config = config or {}
+    with _shared_lock:
+        if _rate_limiter is None:
+            _rate_limiter = TokenBucket(
+                config.get("prober_rate_limit", DEFAULT_PROBER_RATE_LIMIT)
+            )
+            _circuit_breaker = CircuitBreaker(
+                config.get("circuit_breaker_threshold", DEFAULT_BREAKER_THRESHOLD),
+                config.get("circuit_breaker_reset", DEFAULT_BREAKER_RESET_TIMEOUT),
+            )
+    return _rate_limiter, _circuit_breaker
+
+
+class ProberTransport:
+    """通过 requests.Session 发送请求，为每次请求加上超时、限速、重试与熔断"""
+
+    def __init__(
+        self,
+        session,
+        timeout=DEFAULT_NETWORK_TIMEOUT,
+        max_retries=DEFAULT_NETWORK_MAX_RETRIES,
+        backoff=DEFAULT_NETWORK_RETRY_BACKOFF,
+        rate_limiter=None,
+        circuit_breaker=None,
+    ):
+        self.session = session
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        if rate_limiter is None or circuit_breaker is None:
+            shared_limiter, shared_breaker = get_shared_guards()
+            rate_limiter = rate_limiter or shared_limiter
+            circuit_breaker = circuit_breaker or shared_breaker
+        self.rate_limiter = rate_limiter
+        self.circuit_breaker = circuit_breaker
+
+    @classmethod
+    def from_config(cls, session, config):
+        rate_limiter, circuit_breaker = get_shared_guards(config)
+        return cls(
+            session,
+            config.get("network_timeout", DEFAULT_NETWORK_TIMEOUT),
+            config.get("network_max_retries", DEFAULT_NETWORK_MAX_RETRIES),
+            config.get("network_retry_backoff", DEFAULT_NETWORK_RETRY_BACKOFF),
+            rate_limiter,
+            circuit_breaker,
+        )
+
+    def retry_delay(self, attempt, response=None):
+        """第 attempt 次重试前等待的秒数，优先使用服务器的 Retry-After"""
+        if response is not None:
+            retry_after = response.headers.get("Retry-After", "")
+            if retry_after.isdigit():
+                return min(float(retry_after), MAX_RETRY_DELAY)
+        delay = min(self.backoff * 2**attempt, MAX_RETRY_DELAY)
+        return delay * random.uniform(0.5, 1.0)
+
+    def request(self, method, url, **kwargs):
+        """发送请求，连接失败、超时或服务器暂时不可用时重试
+
+        Returns:
+            requests.Response: 最后一次请求的响应，状态码由调用方检查
+
+        Raises:
+            CircuitOpenError: 熔断期间不发送请求
+            requests.exceptions.RequestException: 重试后仍无法连接
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        for attempt in range(self.max_retries + 1):
+            self.circuit_breaker.before_call()
+            self.rate_limiter.acquire()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (ConnectionError, Timeout):
+                self.circuit_breaker.record_failure()
+                if attempt == self.max_retries:
+                    raise
+                response = None
+            except BaseException:
+                # 其他异常不重试，但也要计为失败，否则半开状态的试探请求不会结束
+                self.circuit_breaker.record_failure()
+                raise
+            else:
+                if response.status_code not in RETRY_STATUS_CODES:
+                    self.circuit_breaker.record_success()
+                    return response
+                self.circuit_breaker.record_failure()
+                if attempt == self.max_retries:
+                    return response
+                response.close()
+
+            count("http.retries")
+            time.sleep(self.retry_delay(attempt, response))
@@ -0,0 +1,187 @@
+"""根据 Aqua 中的成绩与 diving-fish 定数重新计算 DX Rating
+
+用法: python -m src.rating [--user-id N] [--write]
+"""
+
+import argparse
+from .aqua_db import get_connection
+from .aquadx_to_diving_fish import get_music_catalog
+from .init_config import load_config
+
+B35_SIZE = 35
+B15_SIZE = 15
+MAX_ACHIEVEMENT = 1005000
+
+# (达成率下限，Aqua 中以 1/10000 % 为单位, 系数)，与 diving-fish 的计算方式一致
+RATING_FACTORS = [
+    (1005000, 22.4),
+    (1000000, 21.6),
+    (995000, 21.1),
+    (990000, 20.8),
+    (980000, 20.3),
+    (970000, 20.0),
+    (940000, 16.8),
+    (900000, 15.2),
+    (800000, 13.6),
+    (750000, 12.0),
+    (700000, 11.2),
+    (600000, 9.6),
+    (500000, 8.0),
+    (400000, 6.4),
+    (300000, 4.8),
+    (200000, 3.2),
+    (100000, 1.6),
+]
+
+CHART_CONSTANT_TABLE = "temp.adm_chart_constant"
+
+CREATE_CHART_CONSTANT_SQL = f"""
+    CREATE TABLE IF NOT EXISTS {CHART_CONSTANT_TABLE} (
+        music_id INTEGER, level INTEGER, ds REAL, is_new INTEGER,
+        PRIMARY KEY (music_id, level)
+    )
+"""
+
+RATING_FACTOR_SQL = (
+    "CASE "
+    + " ".join(
+        f"WHEN d.achievement >= {threshold} THEN {factor}"
+        for threshold, factor in RATING_FACTORS
+    )
+    + " ELSE 0 END"
+)
+
+# 每个谱面的 rating 在 SQL 中一次算出，再按玩家与新旧版本取前 35/15 求和
+BEST_RATING_SQL = f"""
+    WITH rated AS (
+        SELECT d.user_id, c.is_new,
+               CAST(
+                   c.ds * (MIN(d.achievement, {MAX_ACHIEVEMENT}) / 1000000.0)
+                   * ({RATING_FACTOR_SQL})
+                   AS INTEGER
+               ) AS rating
+        FROM maimai2_user_music_detail AS d
+        JOIN {CHART_CONSTANT_TABLE} AS c
+            ON c.music_id = d.music_id AND c.level = d.level
+        {{where}}
+    ),
+    ranked AS (
+        SELECT user_id, is_new, rating,
+               ROW_NUMBER() OVER (
+                   PARTITION BY user_id, is_new ORDER BY rating DESC
+               ) AS position
+        FROM rated
+    )
+    SELECT user_id, is_new, SUM(rating)
+    FROM ranked
+    WHERE position <= CASE WHEN is_new THEN {B15_SIZE} ELSE {B35_SIZE} END
+    GROUP BY user_id, is_new
+"""
+
+
+def chart_rating(ds, achievement):
+    """单个谱面的 rating
+
+    Args:
+        ds (float): 谱面定数
+        achievement (int): Aqua 中的达成率，单位为 1/10000 %
+
+    Returns:
+        int: 该谱面的 rating
+    """
+    factor = next(
+        (factor for threshold, factor in RATING_FACTORS if achievement >= threshold),
+        0,
+    )
+    return int(ds * (min(achievement, MAX_ACHIEVEMENT) / 1000000.0) * factor)
+
+
+def load_chart_constants(conn, music_catalog):
+    """将曲目数据中的定数写入当前连接的临时表，不会修改数据库文件"""
+    conn.execute(CREATE_CHART_CONSTANT_SQL)
+    # 及时提交，避免隐式事务一直持有数据库的读锁
+    with conn:
+        conn.execute(f"DELETE FROM {CHART_CONSTANT_TABLE}")
+        conn.executemany(
+            f"INSERT OR IGNORE INTO {CHART_CONSTANT_TABLE} VALUES (?, ?, ?, ?)",
+            (
+                (
+                    int(music["id"]),
+                    level,
+                    ds,
+                    int(bool(music.get("basic_info", {}).get("is_new"))),
+                )
+                for music in music_catalog.music_data
+                for level, ds in enumerate(music.get("ds") or [])
+            ),
+        )
+
+
+def compute_ratings(conn, music_catalog, user_id=None):
+    """计算一个或全部玩家的 b35、b15 与总 rating
+
+    Args:
+        conn (sqlite3.Connection): Aqua 数据库连接
+        music_catalog (MusicCatalog): 提供定数的曲目数据
+        user_id (int, optional): 只计算该玩家，默认计算全部玩家. Defaults to None.
+
+    Returns:
+        dict: user_id 到 {"rating", "b35", "b15"} 的映射
+    """
+    load_chart_constants(conn, music_catalog)
+    if user_id is None:
+        rows = conn.execute(BEST_RATING_SQL.format(where=""))
+    else:
+        rows = conn.execute(
+            BEST_RATING_SQL.format(where="WHERE d.user_id = ?"), (user_id,)
+        )
+
+    ratings = {}
+    for row_user_id, is_new, total in rows:
+        rating = ratings.setdefault(row_user_id, {"rating": 0, "b35": 0, "b15": 0})
+        rating["b15" if is_new else "b35"] = total
+        rating["rating"] += total
+    return ratings
+
+
+def write_ratings(conn, ratings):
+    """将计算结果写回 maimai2_user_detail 的 player_rating（及 highest_rating）"""
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(maimai2_user_detail)")}
+    if "highest_rating" in columns:
+        sql = (
+            "UPDATE maimai2_user_detail SET player_rating = ?, "
+            "highest_rating = MAX(COALESCE(highest_rating, 0), ?) WHERE id = ?"
+        )
+        params = (
+            (rating["rating"], rating["rating"], user_id)
+            for user_id, rating in ratings.items()
+        )
+    else:
+        sql = "UPDATE maimai2_user_detail SET player_rating = ? WHERE id = ?"
+        params = ((rating["rating"], user_id) for user_id, rating in ratings.items())
+
+    with conn:
+        conn.executemany(sql, params)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="重新计算玩家的 DX Rating")
+    parser.add_argument("--user-id", type=int, help="只计算该玩家，默认计算全部玩家")
+    parser.add_argument("--write", action="store_true", help="写回 maimai2_user_detail")
+    args = parser.parse_args(argv)
+
+    config = load_config()
+    conn = get_connection(config)
+    ratings = compute_ratings(conn, get_music_catalog(config), args.user_id)
+    for user_id, rating in sorted(ratings.items()):
+        print(
+            f"user_id: {user_id}, rating: {rating['rating']} "
+            f"(b35: {rating['b35']}, b15: {rating['b15']})"
+        )
+    if args.write:
+        write_ratings(conn, ratings)
+        print(f"已写回 {len(ratings)} 个玩家的 rating")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""Aqua 与 diving-fish 之间成绩字段的编码转换
+
+映射表与择优顺序在导入时一次建好，两个同步方向共用；批量函数按列转换一批成绩。
+"""
+
+# 从差到好的顺序，diving-fish 使用字符串，Aqua 使用整数编码
+DIVING_FISH_COMBO_ORDER = ("", "fc", "fcp", "ap", "app")
+DIVING_FISH_SYNC_ORDER = ("", "fs", "fsp", "fsd", "fsdp", "sync")
+
+AQUA_COMBO_STATUS = {"fc": 1, "fcp": 2, "ap": 3, "app": 4}
+AQUA_SYNC_STATUS = {"sync": 5, "fs": 1, "fsp": 2, "fsd": 3, "fsdp": 4}
+DIVING_FISH_COMBO_STATUS = {v: k for k, v in AQUA_COMBO_STATUS.items()}
+DIVING_FISH_SYNC_STATUS = {v: k for k, v in AQUA_SYNC_STATUS.items()}
+
+# 择优时比较的名次，未知的值视为最差
+AQUA_COMBO_RANK = {
+    AQUA_COMBO_STATUS.get(value, 0): rank
+    for rank, value in enumerate(DIVING_FISH_COMBO_ORDER)
+}
+AQUA_SYNC_RANK = {
+    AQUA_SYNC_STATUS.get(value, 0): rank
+    for rank, value in enumerate(DIVING_FISH_SYNC_ORDER)
+}
+
+
+def to_aqua_achievements(values):
+    return [int(10000 * value) for value in values]
+
+
+def to_aqua_combo_status(values):
+    get = AQUA_COMBO_STATUS.get
+    return [get(value, 0) for value in values]
+
+
+def to_aqua_sync_status(values):
+    get = AQUA_SYNC_STATUS.get
+    return [get(value, 0) for value in values]
+
+
+def to_diving_fish_achievements(values):
+    return [round(value / 10000, 4) for value in values]
+
+
+def to_diving_fish_combo_status(values):
+    get = DIVING_FISH_COMBO_STATUS.get
+    return [get(value, "") for value in values]
+
+
+def to_diving_fish_sync_status(values):
+    get = DIVING_FISH_SYNC_STATUS.get
+    return [get(value, "") for value in values]
@@ -0,0 +1,180 @@
+"""预览同步会对每个谱面造成的改动，不写入任何数据
+
+用法: python -m src.score_diff {download,upload} --user-id N [--overwrite]
+                              [--format json|csv] [--output report.json]
+
+download 为 diving-fish 同步至 AquaDX，upload 为 AquaDX 上传至 diving-fish。
+"""
+
+import argparse
+import copy
+import csv
+import json
+import sys
+from collections import Counter
+from .aqua_db import get_connection
+from .aquadx_to_diving_fish import (
+    fetch_aqua_sqlite,
+    get_music_catalog,
+    parse_aqua_data,
+)
+from .diving_fish_prober import get_client, stream_player_scores
+from .diving_fish_to_aquadx import (
+    iter_chart_scores,
+    load_user_scores,
+    merge_chart_score,
+)
+from .init_config import load_config
+from .score_merge import hash_join
+
+INSERT = "insert"
+UPDATE = "update"
+UNCHANGED = "unchanged"
+DELETE = "delete"
+ACTIONS = (INSERT, UPDATE, UNCHANGED, DELETE)
+
+SCORE_FIELDS = ("achievement", "combo_status", "sync_status", "deluxscore_max")
+
+
+def diff_scores(existing, incoming, merge, overwrite=False):
+    """以与同步相同的合并规则计算每个谱面的改动
+
+    Args:
+        existing (dict): 目标端已有成绩，谱面键到 ChartScore，不会被修改
+        incoming (iterable): 将要写入目标端的 ChartScore
+        merge (callable): 同一谱面的择优合并函数，原地合并进第一个参数
+        overwrite (bool, optional): 是否覆写，覆写时目标端独有的谱面会被删除. Defaults to False.
+
+    Returns:
+        list: 按谱面键排序的 (动作, 谱面键, 改动前成绩, 改动后成绩)
+    """
+    base = {} if overwrite else existing
+    merged = {}
+    for key, score, new_score in hash_join(
+        base, incoming, key=lambda new_score: new_score.key
+    ):
+        current = merged.get(key)
+        if current is None:
+            if score is None:
+                merged[key] = copy.copy(new_score)
+                continue
+            current = merged[key] = copy.copy(score)
+        merge(current, new_score)
+
+    changes = []
+    for key in sorted(existing.keys() | merged.keys()):
+        before = existing.get(key)
+        after = merged.get(key)
+        if after is None:
+            action = DELETE if overwrite else UNCHANGED
+            after = None if overwrite else before
+        elif before is None:
+            action = INSERT
+        elif after.score_values() == before.score_values():
+            action = UNCHANGED
+        else:
+            action = UPDATE
+        changes.append((action, key, before, after))
+    return changes
+
+
+def diff_download(config, user_id, overwrite=False):
+    """预览 diving-fish 同步至 AquaDX 的改动"""
+    existing = load_user_scores(get_connection(config), user_id)
+    incoming = iter_chart_scores(stream_player_scores(config)["records"])
+    return diff_scores(existing, incoming, merge_chart_score, overwrite)
+
+
+def diff_upload(config, user_id, overwrite=False):
+    """预览 AquaDX 上传至 diving-fish 的改动，diving-fish 上的 DX 分数保持不变"""
+    aqua_scores = parse_aqua_data(
+        fetch_aqua_sqlite(get_connection(config), user_id), get_music_catalog(config)
+    )
+    remote_records = get_client(config).iter_player_records(
+        config["username"], config["password"]
+    )
+    remote_scores = {}
+    for remote_score in iter_chart_scores(remote_records):
+        remote_scores.setdefault(remote_score.key, remote_score)
+    return diff_scores(
+        remote_scores,
+        aqua_scores,
+        lambda remote_score, aqua_score: remote_score.merge_best(aqua_score),
+        overwrite,
+    )
+
+
+def summarize(changes):
+    """统计各动作的谱面数"""
+    counts = Counter(action for action, _, _, _ in changes)
+    return {action: counts[action] for action in ACTIONS}
+
+
+def change_rows(changes, changes_only=False):
+    """将改动展开为便于输出的字典"""
+    for action, (music_id, level), before, after in changes:
+        if changes_only and action == UNCHANGED:
+            continue
+        row = {"action": action, "music_id": music_id, "level": level}
+        for prefix, score in (("before", before), ("after", after)):
+            values = score.score_values() if score is not None else (None,) * 4
+            for field, value in zip(SCORE_FIELDS, values):
+                row[f"{prefix}_{field}"] = value
+        yield row
+
+
+def write_report(changes, out, report_format="json", changes_only=False):
+    """以 JSON 或 CSV 格式输出改动明细
+
+    Args:
+        changes (list): diff_scores 返回的改动
+        out (file): 输出的文本文件对象
+        report_format (str, optional): json 或 csv. Defaults to "json".
+        changes_only (bool, optional): 是否省略没有变化的谱面. Defaults to False.
+    """
+    rows = change_rows(changes, changes_only)
+    if report_format == "csv":
+        fieldnames = ["action", "music_id", "level"] + [
+            f"{prefix}_{field}"
+            for prefix in ("before", "after")
+            for field in SCORE_FIELDS
+        ]
+        writer = csv.DictWriter(out, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(rows)
+    else:
+        json.dump(
+            {"summary": summarize(changes), "changes": list(rows)},
+            out,
+            ensure_ascii=False,
+            indent=2,
+        )
+        out.write("\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="预览同步对每个谱面的改动")
+    parser.add_argument("direction", choices=["download", "upload"])
+    parser.add_argument("--user-id", type=int, required=True)
+    parser.add_argument("--overwrite", action="store_true", help="按覆盖成绩预览")
+    parser.add_argument("--format", choices=["json", "csv"], default="json")
+    parser.add_argument("--output", help="输出文件，默认输出到终端")
+    parser.add_argument(
+        "--changes-only", action="store_true", help="省略没有变化的谱面"
+    )
+    args = parser.parse_args(argv)
+
+    config = load_config()
+    preview = diff_download if args.direction == "download" else diff_upload
+    changes = preview(config, args.user_id, args.overwrite)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8", newline="") as f:
+            write_report(changes, f, args.format, args.changes_only)
+        print(summarize(changes))
+    else:
+        write_report(changes, sys.stdout, args.format, args.changes_only)
+
+
+if __name__ == "__main__":
+    main()
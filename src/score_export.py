@@ -0,0 +1,299 @@
+"""导出与导入 Aqua 的玩家与成绩表，用于在不同 Aqua 之间迁移玩家
+
+用法:
+    python -m src.score_export export PATH [--format ndjson|csv] [--user-id N ...]
+    python -m src.score_export import PATH [--format ndjson|csv] [--user-map OLD:NEW ...] [--overwrite]
+
+ndjson 格式导出为单个文件，每行为 {"table": 表名, "row": {列名: 值}}；
+csv 格式导出到 PATH 目录，每个表一个 <表名>.csv 文件。
+"""
+
+import argparse
+import csv
+import json
+import os
+from tqdm import tqdm
+from .aqua_db import get_connection
+from .chart_score import ChartScore
+from .diving_fish_to_aquadx import (
+    DELETE_USER_SCORES_SQL,
+    WRITE_BATCH_SIZE,
+    load_user_scores,
+    merge_chart_score,
+    write_scores,
+)
+from .init_config import load_config
+
+USER_DETAIL_TABLE = "maimai2_user_detail"
+MUSIC_DETAIL_TABLE = "maimai2_user_music_detail"
+# 表名与用于筛选玩家的列，导入时先处理玩家信息
+EXPORT_TABLES = {USER_DETAIL_TABLE: "id", MUSIC_DETAIL_TABLE: "user_id"}
+EXPORT_BATCH_SIZE = 5000
+
+
+def iter_table_rows(conn, table_name, user_column, user_ids=None):
+    """以 fetchmany 分批读取表中的行
+
+    Yields:
+        tuple: 第一次产出列名列表，之后每次产出一批行
+    """
+    sql = f'SELECT * FROM "{table_name}"'
+    params = ()
+    if user_ids:
+        sql += f' WHERE "{user_column}" IN ({", ".join("?" for _ in user_ids)})'
+        params = tuple(user_ids)
+    cursor = conn.execute(sql, params)
+    yield [column[0] for column in cursor.description]
+    while True:
+        rows = cursor.fetchmany(EXPORT_BATCH_SIZE)
+        if not rows:
+            return
+        yield rows
+
+
+def export_tables(conn, path, export_format="ndjson", user_ids=None):
+    """将玩家与成绩表导出到 NDJSON 文件或 CSV 目录
+
+    Args:
+        conn (sqlite3.Connection): Aqua 数据库连接
+        path (str): ndjson 格式为文件路径，csv 格式为目录
+        export_format (str, optional): ndjson 或 csv. Defaults to "ndjson".
+        user_ids (list, optional): 只导出这些玩家，默认导出全部玩家. Defaults to None.
+
+    Returns:
+        dict: 每个表导出的行数
+    """
+    counts = {}
+    if export_format == "csv":
+        os.makedirs(path, exist_ok=True)
+    else:
+        ndjson_file = open(path, "w", encoding="utf-8")
+
+    try:
+        for table_name, user_column in EXPORT_TABLES.items():
+            batches = iter_table_rows(conn, table_name, user_column, user_ids)
+            columns = next(batches)
+            counts[table_name] = 0
+            if export_format == "csv":
+                csv_path = os.path.join(path, f"{table_name}.csv")
+                with open(csv_path, "w", encoding="utf-8", newline="") as f:
+                    writer = csv.writer(f)
+                    writer.writerow(columns)
+                    for rows in batches:
+                        writer.writerows(rows)
+                        counts[table_name] += len(rows)
+            else:
+                for rows in batches:
+                    ndjson_file.writelines(
+                        json.dumps(
+                            {"table": table_name, "row": dict(zip(columns, row))},
+                            ensure_ascii=False,
+                        )
+                        + "\n"
+                        for row in rows
+                    )
+                    counts[table_name] += len(rows)
+    finally:
+        if export_format != "csv":
+            ndjson_file.close()
+    return counts
+
+
+def _csv_value(value):
+    """CSV 中的空字段视为 NULL，其余交给 sqlite 按列类型转换"""
+    return None if value == "" else value
+
+
+def read_exported_rows(path, import_format="ndjson"):
+    """逐行读取导出文件，产出 (表名, 行字典)，玩家信息先于成绩"""
+    if import_format == "csv":
+        for table_name in EXPORT_TABLES:
+            csv_path = os.path.join(path, f"{table_name}.csv")
+            if not os.path.exists(csv_path):
+                continue
+            with open(csv_path, "r", encoding="utf-8", newline="") as f:
+                for row in csv.DictReader(f):
+                    yield table_name, {
+                        column: _csv_value(value) for column, value in row.items()
+                    }
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    item = json.loads(line)
+                    yield item["table"], item["row"]
+
+
+def chart_score_from_row(row, user_id):
+    return ChartScore(
+        music_id=int(row["music_id"]),
+        level=int(row["level"]),
+        achievement=int(row["achievement"]),
+        combo_status=int(row["combo_status"]),
+        sync_status=int(row["sync_status"]),
+        deluxscore_max=int(row["deluxscore_max"]),
+        play_count=int(row.get("play_count") or 1),
+        user_id=user_id,
+    )
+
+
+class ScoreImporter:
+    """在一个事务中将导出的行择优合并进 Aqua 数据库
+
+    玩家已存在时保留原有玩家信息，只合并成绩；成绩的合并规则与 save_player_scores 一致。
+    玩家信息与其他玩家的唯一列冲突而无法导入时，跳过该玩家的成绩。
+    """
+
+    def __init__(self, conn, user_map=None, overwrite=False):
+        self.conn = conn
+        self.user_map = user_map or {}
+        self.overwrite = overwrite
+        self.user_columns = {
+            row[1] for row in conn.execute(f"PRAGMA table_info({USER_DETAIL_TABLE})")
+        }
+        self.existing_scores = {}
+        self.new_scores = {}
+        self.updated_scores = {}
+        self.skipped_users = set()
+        self.stats = {
+            "users": 0,
+            "inserted": 0,
+            "updated": 0,
+            "unchanged": 0,
+            "skipped": 0,
+        }
+        max_id = conn.execute(f"SELECT MAX(id) FROM {MUSIC_DETAIL_TABLE}").fetchone()[0]
+        self.next_id = (max_id + 1) if max_id is not None else 1
+
+    def map_user(self, user_id):
+        user_id = int(user_id)
+        return self.user_map.get(user_id, user_id)
+
+    def import_user(self, row):
+        row = dict(row, id=self.map_user(row["id"]))
+        columns = [column for column in row if column in self.user_columns]
+        quoted_columns = ", ".join(f'"{column}"' for column in columns)
+        placeholders = ", ".join("?" for _ in columns)
+        cursor = self.conn.execute(
+            f"INSERT OR IGNORE INTO {USER_DETAIL_TABLE} ({quoted_columns}) "
+            f"VALUES ({placeholders})",
+            [row[column] for column in columns],
+        )
+        if cursor.rowcount:
+            self.stats["users"] += 1
+            return
+        exists = self.conn.execute(
+            f"SELECT 1 FROM {USER_DETAIL_TABLE} WHERE id = ?", (row["id"],)
+        ).fetchone()
+        if exists is None:
+            self.skipped_users.add(row["id"])
+
+    def user_scores(self, user_id):
+        scores = self.existing_scores.get(user_id)
+        if scores is None:
+            if self.overwrite:
+                self.conn.execute(DELETE_USER_SCORES_SQL, (user_id,))
+                scores = {}
+            else:
+                scores = load_user_scores(self.conn, user_id)
+            self.existing_scores[user_id] = scores
+        return scores
+
+    def import_score(self, row):
+        user_id = self.map_user(row["user_id"])
+        if user_id in self.skipped_users:
+            self.stats["skipped"] += 1
+            return
+        new_score = chart_score_from_row(row, user_id)
+        existing_scores = self.user_scores(user_id)
+        key = new_score.key
+        pending_key = (user_id, key)
+        score = existing_scores.get(key)
+        if score is None:
+            new_score.id = self.next_id
+            self.next_id += 1
+            existing_scores[key] = new_score
+            self.new_scores[pending_key] = new_score
+        else:
+            previous_values = score.score_values()
+            merge_chart_score(score, new_score)
+            if score.score_values() == previous_values:
+                self.stats["unchanged"] += 1
+            elif pending_key not in self.new_scores:
+                score.score_rank = 0
+                score.ext_num1 = 0
+                self.updated_scores[pending_key] = score
+
+        if len(self.new_scores) + len(self.updated_scores) >= WRITE_BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        self.stats["inserted"] += len(self.new_scores)
+        self.stats["updated"] += len(self.updated_scores)
+        write_scores(self.conn, self.new_scores, self.updated_scores)
+
+    def run(self, rows):
+        with self.conn:
+            for table_name, row in rows:
+                if table_name == USER_DETAIL_TABLE:
+                    self.import_user(row)
+                elif table_name == MUSIC_DETAIL_TABLE:
+                    self.import_score(row)
+            self.flush()
+        return self.stats
+
+
+def parse_user_map(values):
+    user_map = {}
+    for value in values or []:
+        old_id, _, new_id = value.partition(":")
+        user_map[int(old_id)] = int(new_id)
+    return user_map
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="导出与导入 Aqua 的玩家与成绩")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export_parser = subparsers.add_parser("export", help="导出玩家与成绩")
+    export_parser.add_argument("path")
+    export_parser.add_argument("--format", choices=["ndjson", "csv"], default="ndjson")
+    export_parser.add_argument(
+        "--user-id", type=int, action="append", help="只导出该玩家，可重复指定"
+    )
+    import_parser = subparsers.add_parser("import", help="择优导入玩家与成绩")
+    import_parser.add_argument("path")
+    import_parser.add_argument("--format", choices=["ndjson", "csv"], default="ndjson")
+    import_parser.add_argument(
+        "--user-map",
+        action="append",
+        metavar="OLD:NEW",
+        help="将导出文件中的玩家导入为另一个 user_id，可重复指定",
+    )
+    import_parser.add_argument(
+        "--overwrite", action="store_true", help="清除导入玩家的已有成绩"
+    )
+    args = parser.parse_args(argv)
+
+    conn = get_connection(load_config())
+    if args.command == "export":
+        counts = export_tables(conn, args.path, args.format, args.user_id)
+        for table_name, row_count in counts.items():
+            print(f"{table_name}: 导出 {row_count} 行")
+    else:
+        importer = ScoreImporter(conn, parse_user_map(args.user_map), args.overwrite)
+        rows = tqdm(read_exported_rows(args.path, args.format), desc="导入", unit="row")
+        stats = importer.run(rows)
+        print(
+            f"新增玩家 {stats['users']} 个，新增成绩 {stats['inserted']} 条，"
+            f"更新 {stats['updated']} 条，{stats['unchanged']} 条无变化"
+        )
+        if importer.skipped_users:
+            print(
+                f"玩家 {', '.join(map(str, sorted(importer.skipped_users)))} "
+                "与已有玩家的唯一字段冲突，未能导入，已跳过其 "
+                f"{stats['skipped']} 条成绩，请先处理冲突的玩家后重试"
+            )
+
+
+if __name__ == "__main__":
+    main()
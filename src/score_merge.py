@@ -0,0 +1,19 @@
+def chart_key(record):
+    """diving-fish 格式成绩的谱面键"""
+    return (record["song_id"], record["level_index"])
+
+
+def hash_join(index, incoming, key=chart_key):
+    """逐条查找 incoming 在 index 中的同一谱面
+
+    Args:
+        index (dict): 谱面键到已有成绩的索引，调用方可在迭代中向其追加
+        incoming (iterable): 待合并的成绩
+        key (callable, optional): 从 incoming 中的成绩取谱面键. Defaults to chart_key.
+
+    Yields:
+        tuple: (谱面键, 已有成绩或 None, 待合并成绩)
+    """
+    for record in incoming:
+        record_key = key(record)
+        yield record_key, index.get(record_key), record
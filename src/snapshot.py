@@ -0,0 +1,359 @@
+import contextlib
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import time
+from tqdm import tqdm
+from .aqua_db import connect
+from .aquadx_get_user import get_user, query_users
+from .init_config import get_db_path
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+SNAPSHOT_MANIFEST_FILE = "snapshots.json"
+BACKUP_PAGE_STEP = 1024
+COPY_BATCH_SIZE = 5000
+SNAPSHOT_INFO_TABLE = "adm_snapshot_info"
+SNAPSHOT_FILE_PATTERN = re.compile(
+    r"^save(?P<index>\d+)(?:_u(?P<user_id>\d+))?\.sqlite(?:\.(?P<compression>gz|zst))?$"
+)
+COMPRESSION_SUFFIXES = {None: "", "gzip": ".gz", "zstd": ".zst"}
+
+
+def list_snapshot_files(directory="."):
+    """按存档编号排序列出存档文件"""
+    matches = []
+    for file_name in os.listdir(directory):
+        match = SNAPSHOT_FILE_PATTERN.match(file_name)
+        if match:
+            matches.append((int(match["index"]), file_name))
+    return [file_name for _, file_name in sorted(matches)]
+
+
+def next_snapshot_name(user_id=None, compression=None, directory="."):
+    """找到第一个可用的存档位"""
+    used_indices = {
+        int(SNAPSHOT_FILE_PATTERN.match(file_name)["index"])
+        for file_name in list_snapshot_files(directory)
+    }
+    save_index = 1
+    while save_index in used_indices:
+        save_index += 1
+
+    user_suffix = f"_u{user_id}" if user_id is not None else ""
+    return f"save{save_index}{user_suffix}.sqlite{COMPRESSION_SUFFIXES[compression]}"
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def read_manifest(directory="."):
+    """读取存档清单，文件名 -> 存档信息"""
+    manifest_path = os.path.join(directory, SNAPSHOT_MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        return {}
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_manifest(manifest, directory="."):
+    manifest_path = os.path.join(directory, SNAPSHOT_MANIFEST_FILE)
+    temp_path = f"{manifest_path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=4)
+    os.replace(temp_path, manifest_path)
+
+
+def update_manifest(path, entry):
+    directory = os.path.dirname(os.path.abspath(path))
+    manifest = read_manifest(directory)
+    manifest[os.path.basename(path)] = entry
+    # 顺便清理已被删除的存档
+    manifest = {
+        file_name: info
+        for file_name, info in manifest.items()
+        if os.path.exists(os.path.join(directory, file_name))
+    }
+    write_manifest(manifest, directory)
+
+
+def manifest_entry(manifest, path):
+    """返回与存档文件大小、修改时间一致的清单条目，存档被替换过时返回 None
+
+    sqlite 文件的大小总是页大小的整数倍，只比较大小无法发现被替换的存档。
+    """
+    entry = manifest.get(os.path.basename(path))
+    if entry is None or not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    if entry.get("size") != stat.st_size or entry.get("mtime_ns") != stat.st_mtime_ns:
+        return None
+    return entry
+
+
+def drop_manifest_entry(path):
+    """存档被替换后清单条目已过时，删除后该存档会被重新读取"""
+    directory = os.path.dirname(os.path.abspath(path))
+    manifest = read_manifest(directory)
+    if manifest.pop(os.path.basename(path), None) is not None:
+        write_manifest(manifest, directory)
+
+
+def list_snapshots(directory="."):
+    """列出存档及其中的玩家信息
+
+    有清单条目的存档只读取清单，没有条目或条目已过时的存档会被原地只读打开（压缩的存档需先解压）。
+
+    Returns:
+        list: (文件名, 玩家列表) 的列表
+    """
+    manifest = read_manifest(directory)
+    snapshots = []
+    for file_name in list_snapshot_files(directory):
+        path = os.path.join(directory, file_name)
+        entry = manifest_entry(manifest, path)
+        if entry is None and file_name in manifest:
+            drop_manifest_entry(path)
+        if entry is not None:
+            users = entry["users"]
+        elif snapshot_compression(path) is None:
+            users = get_user(path, read_only=True)
+        else:
+            with open_snapshot(path) as snapshot_path:
+                users = get_user(snapshot_path, read_only=True)
+        snapshots.append((file_name, users))
+    return snapshots
+
+
+def snapshot_compression(path):
+    if path.endswith(".gz"):
+        return "gzip"
+    if path.endswith(".zst"):
+        return "zstd"
+    return None
+
+
+def compress_file(source_path, target_path, compression):
+    if compression == "gzip":
+        with open(source_path, "rb") as src, gzip.open(target_path, "wb") as dst:
+            shutil.copyfileobj(src, dst)
+    elif compression == "zstd":
+        if zstandard is None:
+            raise RuntimeError("使用 zstd 压缩存档需要先安装 zstandard")
+        with open(source_path, "rb") as src, open(target_path, "wb") as dst:
+            zstandard.ZstdCompressor().copy_stream(src, dst)
+    else:
+        shutil.copyfile(source_path, target_path)
+
+
+def decompress_file(source_path, target_path, compression):
+    if compression == "gzip":
+        with gzip.open(source_path, "rb") as src, open(target_path, "wb") as dst:
+            shutil.copyfileobj(src, dst)
+    elif compression == "zstd":
+        if zstandard is None:
+            raise RuntimeError("读取 zstd 压缩的存档需要先安装 zstandard")
+        with open(source_path, "rb") as src, open(target_path, "wb") as dst:
+            zstandard.ZstdDecompressor().copy_stream(src, dst)
+    else:
+        shutil.copyfile(source_path, target_path)
+
+
+@contextlib.contextmanager
+def open_snapshot(path):
+    """得到可以直接用 sqlite 打开的存档路径，压缩的存档会先解压到临时文件"""
+    compression = snapshot_compression(path)
+    if compression is None:
+        yield path
+        return
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        temp_path = os.path.join(temp_dir, "snapshot.sqlite")
+        decompress_file(path, temp_path, compression)
+        yield temp_path
+
+
+def backup_with_progress(source, target, desc):
+    """使用 sqlite 在线备份 API 分步复制数据库页"""
+    with tqdm(desc=desc, unit="page") as pbar:
+
+        def progress(status, remaining, total):
+            pbar.total = total
+            pbar.n = total - remaining
+            pbar.refresh()
+
+        source.backup(target, pages=BACKUP_PAGE_STEP, progress=progress)
+
+
+def user_tables(conn):
+    """返回 maimai2_* 表中按玩家区分的表及用于筛选玩家的列"""
+    tables = {}
+    for (table_name,) in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE 'maimai2_%'"
+    ):
+        columns = [row[1] for row in conn.execute(f'PRAGMA table_info("{table_name}")')]
+        if "user_id" in columns:
+            tables[table_name] = "user_id"
+        elif table_name == "maimai2_user_detail":
+            tables[table_name] = "id"
+    return tables
+
+
+def copy_rows(source, target, table_name, user_column, user_id):
+    cursor = source.execute(
+        f'SELECT * FROM "{table_name}" WHERE "{user_column}" = ?', (user_id,)
+    )
+    columns = ", ".join(f'"{column[0]}"' for column in cursor.description)
+    placeholders = ", ".join("?" for _ in cursor.description)
+    insert_sql = f'INSERT INTO "{table_name}" ({columns}) VALUES ({placeholders})'
+    while True:
+        rows = cursor.fetchmany(COPY_BATCH_SIZE)
+        if not rows:
+            break
+        target.executemany(insert_sql, rows)
+
+
+def export_user(source, target, user_id):
+    """将单个玩家在 maimai2_* 表中的数据导出到空数据库"""
+    tables = user_tables(source)
+    with target:
+        target.execute(
+            f"CREATE TABLE {SNAPSHOT_INFO_TABLE} (key TEXT PRIMARY KEY, value)"
+        )
+        target.execute(
+            f"INSERT INTO {SNAPSHOT_INFO_TABLE} VALUES ('user_id', ?)", (user_id,)
+        )
+        for table_name, user_column in tqdm(tables.items(), desc="导出玩家数据"):
+            (create_sql,) = source.execute(
+                "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?",
+                (table_name,),
+            ).fetchone()
+            target.execute(create_sql)
+            target.execute(
+                f"INSERT INTO {SNAPSHOT_INFO_TABLE} VALUES (?, ?)",
+                (f"table:{table_name}", user_column),
+            )
+            copy_rows(source, target, table_name, user_column, user_id)
+
+
+def snapshot_user_id(snapshot):
+    """单玩家存档返回其 user_id，完整存档返回 None"""
+    has_info = snapshot.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+        (SNAPSHOT_INFO_TABLE,),
+    ).fetchone()
+    if not has_info:
+        return None
+    return snapshot.execute(
+        f"SELECT value FROM {SNAPSHOT_INFO_TABLE} WHERE key = 'user_id'"
+    ).fetchone()[0]
+
+
+def write_snapshot_db(config, path, user_id=None):
+    """将 Aqua 数据库（或单个玩家的数据）写入未压缩的 sqlite 文件
+
+    Returns:
+        list: 存档中的玩家信息
+    """
+    source = connect(get_db_path(config), config)
+    target = sqlite3.connect(path)
+    try:
+        if user_id is None:
+            backup_with_progress(source, target, "保存存档")
+        else:
+            export_user(source, target, user_id)
+        return query_users(target)
+    finally:
+        target.close()
+        source.close()
+
+
+def restore_snapshot_db(config, path):
+    """用未压缩的存档文件覆盖 Aqua 数据库"""
+    snapshot = sqlite3.connect(path)
+    target = connect(get_db_path(config), config)
+    try:
+        user_id = snapshot_user_id(snapshot)
+        if user_id is None:
+            backup_with_progress(snapshot, target, "读取存档")
+        else:
+            restore_user(snapshot, target, user_id)
+    finally:
+        target.close()
+        snapshot.close()
+
+
+def save_snapshot(config, path, user_id=None, compression=None):
+    """保存存档
+
+    Args:
+        config (dict): adm_config.json 中的配置
+        path (str): 存档文件路径
+        user_id (int, optional): 只保存该玩家的 maimai2_* 数据. Defaults to None.
+        compression (str, optional): None、"gzip" 或 "zstd". Defaults to None.
+    """
+    with tempfile.TemporaryDirectory() as temp_dir:
+        temp_path = os.path.join(temp_dir, "snapshot.sqlite")
+        users = write_snapshot_db(config, temp_path, user_id)
+        compress_file(temp_path, path, compression)
+
+    update_manifest(
+        path,
+        {
+            "users": users,
+            "user_id": user_id,
+            "compression": compression,
+            "created_at": time.time(),
+            "size": os.path.getsize(path),
+            "mtime_ns": os.stat(path).st_mtime_ns,
+            "sha256": file_sha256(path),
+        },
+    )
+
+
+def load_snapshot(config, path):
+    """读取存档覆盖 Aqua 数据库
+
+    完整存档通过在线备份 API 写回，单玩家存档在一个事务中替换该玩家的数据。
+    """
+    manifest = read_manifest(os.path.dirname(os.path.abspath(path)))
+    entry = manifest_entry(manifest, path)
+    if entry is None and os.path.basename(path) in manifest:
+        # 存档文件已被替换，清单中的校验值不再适用
+        drop_manifest_entry(path)
+    elif entry is not None and entry.get("sha256") != file_sha256(path):
+        raise RuntimeError(f"存档 {path} 与保存时的校验值不一致，可能已损坏")
+
+    with open_snapshot(path) as snapshot_path:
+        restore_snapshot_db(config, snapshot_path)
+
+
+def restore_user(snapshot, target, user_id):
+    tables = {
+        key[len("table:") :]: value
+        for key, value in snapshot.execute(
+            f"SELECT key, value FROM {SNAPSHOT_INFO_TABLE} WHERE key LIKE 'table:%'"
+        )
+    }
+    with target:
+        for table_name, user_column in tqdm(tables.items(), desc="读取玩家数据"):
+            target.execute(
+                f'DELETE FROM "{table_name}" WHERE "{user_column}" = ?', (user_id,)
+            )
+            copy_rows(snapshot, target, table_name, user_column, user_id)
@@ -0,0 +1,219 @@
+"""按内容寻址、去重保存的存档仓库
+
+数据库文件按页对齐切分为块，每个不同的块只按其哈希保存一次，存档本身只记录块的顺序。
+
+用法: python -m src.snapshot_store {list,save,restore,delete,gc}
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import tempfile
+import time
+from .init_config import get_sidecar_path, load_config
+from .snapshot import restore_snapshot_db, write_snapshot_db
+
+SNAPSHOT_STORE_DIR = "snapshot_store"
+DEFAULT_CHUNK_PAGES = 16
+# 刚写入的块可能属于正在保存的存档，回收时跳过
+GC_GRACE_SECONDS = 3600
+
+
+def sqlite_page_size(path):
+    """从数据库文件头读取页大小"""
+    with open(path, "rb") as f:
+        header = f.read(100)
+    if len(header) < 100 or not header.startswith(b"SQLite format 3\x00"):
+        raise ValueError(f"{path} 不是 sqlite 数据库文件")
+    page_size = int.from_bytes(header[16:18], "big")
+    return 65536 if page_size == 1 else page_size
+
+
+class SnapshotStore:
+    def __init__(self, root=None, chunk_pages=DEFAULT_CHUNK_PAGES):
+        self.root = root or get_sidecar_path(SNAPSHOT_STORE_DIR)
+        self.chunk_pages = chunk_pages
+        self.chunk_dir = os.path.join(self.root, "chunks")
+        self.snapshot_dir = os.path.join(self.root, "snapshots")
+        os.makedirs(self.chunk_dir, exist_ok=True)
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+
+    def chunk_path(self, digest):
+        return os.path.join(self.chunk_dir, digest[:2], digest)
+
+    def recipe_path(self, name):
+        return os.path.join(self.snapshot_dir, f"{name}.json")
+
+    def write_chunk(self, data):
+        """保存一个块，已存在相同内容时直接复用
+
+        Returns:
+            tuple: (块哈希, 是否新写入)
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.chunk_path(digest)
+        if os.path.exists(path):
+            return digest, False
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+        return digest, True
+
+    def add_file(self, path):
+        """将数据库文件切块存入仓库
+
+        Returns:
+            dict: 存档配方，包含块大小、文件大小与块哈希列表
+        """
+        chunk_size = sqlite_page_size(path) * self.chunk_pages
+        chunks = []
+        new_chunks = 0
+        with open(path, "rb") as f:
+            for data in iter(lambda: f.read(chunk_size), b""):
+                digest, created = self.write_chunk(data)
+                chunks.append(digest)
+                new_chunks += created
+        return {
+            "chunk_size": chunk_size,
+            "size": os.path.getsize(path),
+            "chunks": chunks,
+            "new_chunks": new_chunks,
+        }
+
+    def assemble(self, recipe, path):
+        """按配方重新拼出数据库文件并校验块内容"""
+        with open(path, "wb") as f:
+            for digest in recipe["chunks"]:
+                with open(self.chunk_path(digest), "rb") as chunk:
+                    data = chunk.read()
+                if hashlib.sha256(data).hexdigest() != digest:
+                    raise RuntimeError(f"存档块 {digest} 已损坏")
+                f.write(data)
+
+    def list(self):
+        """按保存时间列出存档配方"""
+        recipes = []
+        for file_name in os.listdir(self.snapshot_dir):
+            if file_name.endswith(".json"):
+                with open(
+                    os.path.join(self.snapshot_dir, file_name), "r", encoding="utf-8"
+                ) as f:
+                    recipes.append(json.load(f))
+        return sorted(recipes, key=lambda recipe: recipe["created_at"])
+
+    def load_recipe(self, name):
+        with open(self.recipe_path(name), "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def save(self, config, user_id=None):
+        """保存存档，只写入之前没有出现过的块
+
+        Returns:
+            dict: 存档配方
+        """
+        created_at = time.time()
+        user_suffix = f"_u{user_id}" if user_id is not None else ""
+        name = time.strftime("%Y%m%d-%H%M%S", time.localtime(created_at)) + user_suffix
+        while os.path.exists(self.recipe_path(name)):
+            name += "_1"
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            temp_path = os.path.join(temp_dir, "snapshot.sqlite")
+            users = write_snapshot_db(config, temp_path, user_id)
+            recipe = self.add_file(temp_path)
+
+        recipe.update(
+            {"name": name, "users": users, "user_id": user_id, "created_at": created_at}
+        )
+        # 块全部写入后才写配方，中断时不会留下引用缺失块的存档
+        temp_recipe_path = f"{self.recipe_path(name)}.tmp"
+        with open(temp_recipe_path, "w", encoding="utf-8") as f:
+            json.dump(recipe, f, ensure_ascii=False)
+        os.replace(temp_recipe_path, self.recipe_path(name))
+        return recipe
+
+    def restore(self, config, name):
+        recipe = self.load_recipe(name)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            temp_path = os.path.join(temp_dir, "snapshot.sqlite")
+            self.assemble(recipe, temp_path)
+            restore_snapshot_db(config, temp_path)
+
+    def delete(self, name):
+        os.remove(self.recipe_path(name))
+
+    def gc(self):
+        """删除没有被任何存档引用的块
+
+        Returns:
+            tuple: (删除的块数, 释放的字节数)
+        """
+        referenced = set()
+        for recipe in self.list():
+            referenced.update(recipe["chunks"])
+
+        removed = 0
+        freed = 0
+        now = time.time()
+        for directory, _, file_names in os.walk(self.chunk_dir):
+            for file_name in file_names:
+                path = os.path.join(directory, file_name)
+                if file_name in referenced:
+                    continue
+                if now - os.path.getmtime(path) < GC_GRACE_SECONDS:
+                    continue
+                freed += os.path.getsize(path)
+                os.remove(path)
+                removed += 1
+        return removed, freed
+
+    def disk_usage(self):
+        total = 0
+        for directory, _, file_names in os.walk(self.root):
+            for file_name in file_names:
+                total += os.path.getsize(os.path.join(directory, file_name))
+        return total
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="去重存档仓库")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("list", help="列出存档")
+    save_parser = subparsers.add_parser("save", help="保存存档")
+    save_parser.add_argument("--user-id", type=int, help="只保存该玩家的数据")
+    restore_parser = subparsers.add_parser("restore", help="读取存档覆盖 Aqua 数据")
+    restore_parser.add_argument("name")
+    delete_parser = subparsers.add_parser("delete", help="删除存档")
+    delete_parser.add_argument("name")
+    subparsers.add_parser("gc", help="回收未被引用的块")
+    args = parser.parse_args(argv)
+
+    store = SnapshotStore()
+    if args.command == "list":
+        for recipe in store.list():
+            users = ", ".join(user["user_name"] for user in recipe["users"])
+            print(f"{recipe['name']} - {recipe['size']} bytes - {users}")
+        print(f"仓库占用: {store.disk_usage()} bytes")
+    elif args.command == "save":
+        recipe = store.save(load_config(), args.user_id)
+        print(
+            f"存档已保存为 {recipe['name']}，"
+            f"新增 {recipe['new_chunks']}/{len(recipe['chunks'])} 个块"
+        )
+    elif args.command == "restore":
+        store.restore(load_config(), args.name)
+        print(f"已加载存档 {args.name}")
+    elif args.command == "delete":
+        store.delete(args.name)
+        print(f"已删除存档 {args.name}，运行 gc 以回收空间")
+    elif args.command == "gc":
+        removed, freed = store.gc()
+        print(f"已删除 {removed} 个块，释放 {freed} bytes")
+
+
+if __name__ == "__main__":
+    main()
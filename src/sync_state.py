@@ -0,0 +1,116 @@
+import hashlib
+import json
+import sqlite3
+import time
+from .init_config import SYNC_STATE_FILE, get_sidecar_path
+
+UPLOAD = "upload"
+DOWNLOAD = "download"
+
+
+def account_key(config):
+    """diving-fish 账号的标识，同一 Aqua 玩家同步到不同账号时分别记录"""
+    return hashlib.sha1(config["username"].encode("utf-8")).hexdigest()[:12]
+
+
+def content_hash(values):
+    """计算单个谱面成绩的内容哈希"""
+    payload = json.dumps(list(values), ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+class SyncStateJournal:
+    """记录每个用户、每个 diving-fish 账号、每个同步方向上各谱面最后一次同步的内容哈希与成绩
+
+    journal 保存在 adm_config.json 同目录下的独立 sqlite 文件中，不修改 Aqua 数据库。
+    """
+
+    def __init__(self, path=None):
+        self.path = path or get_sidecar_path(SYNC_STATE_FILE)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS sync_state (
+                user_id INTEGER NOT NULL,
+                account TEXT NOT NULL,
+                direction TEXT NOT NULL,
+                song_id INTEGER NOT NULL,
+                level_index INTEGER NOT NULL,
+                content_hash TEXT NOT NULL,
+                achievement INTEGER,
+                combo_status INTEGER,
+                sync_status INTEGER,
+                deluxscore_max INTEGER,
+                synced_at REAL NOT NULL,
+                PRIMARY KEY (user_id, account, direction, song_id, level_index)
+            )
+            """)
+        self.conn.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    def load(self, user_id, account, direction):
+        """读取用户与该账号之间在该方向上的同步状态
+
+        Returns:
+            dict: (song_id, level_index) -> (content_hash, (achievement, combo_status, sync_status, deluxscore_max))
+        """
+        cursor = self.conn.execute(
+            """
+            SELECT song_id, level_index, content_hash,
+                   achievement, combo_status, sync_status, deluxscore_max
+            FROM sync_state
+            WHERE user_id = ? AND account = ? AND direction = ?
+            """,
+            (user_id, account, direction),
+        )
+        return {(row[0], row[1]): (row[2], tuple(row[3:])) for row in cursor}
+
+    def record(self, user_id, account, direction, entries):
+        """写入同步成功的谱面
+
+        Args:
+            user_id (int): 用于指示 db.sqlite 中的用户
+            account (str): account_key 返回的 diving-fish 账号标识
+            direction (str): UPLOAD 或 DOWNLOAD
+            entries (iterable): ((song_id, level_index), content_hash, values) 的序列
+        """
+        synced_at = time.time()
+        with self.conn:
+            self.conn.executemany(
+                """
+                INSERT OR REPLACE INTO sync_state (
+                    user_id, account, direction, song_id, level_index,
+                    content_hash, achievement, combo_status, sync_status,
+                    deluxscore_max, synced_at
+                )
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                [
+                    (
+                        user_id,
+                        account,
+                        direction,
+                        key[0],
+                        key[1],
+                        digest,
+                        *values,
+                        synced_at,
+                    )
+                    for key, digest, values in entries
+                ],
+            )
+
+    def reset(self, user_id, account, direction):
+        with self.conn:
+            self.conn.execute(
+                "DELETE FROM sync_state "
+                "WHERE user_id = ? AND account = ? AND direction = ?",
+                (user_id, account, direction),
+            )
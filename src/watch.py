@@ -0,0 +1,161 @@
+"""监视 Aqua 数据库，玩家游玩并保存后自动将变化的成绩上传至 diving-fish
+
+用法: python -m src.watch [--user-id N ...] [--jobs jobs.json] [--interval 2] [--debounce 5]
+
+--user-id 使用 adm_config.json 中的 diving-fish 账号；--jobs 使用批量同步的任务文件，
+其中 direction 为 upload 的任务指定各玩家对应的账号。按 Ctrl+C 退出。
+"""
+
+import argparse
+import os
+import threading
+from .aqua_db import close_connections, connect
+from .aquadx_to_diving_fish import aquadx_data_upload
+from .batch_sync import UPLOAD, load_jobs
+from .init_config import get_db_path, load_config
+
+DEFAULT_POLL_INTERVAL = 2.0
+DEFAULT_DEBOUNCE = 5.0
+
+USER_FINGERPRINT_SQL = """
+    SELECT user_id, COUNT(*), TOTAL(achievement), TOTAL(combo_status),
+           TOTAL(sync_status), TOTAL(deluxscore_max)
+    FROM maimai2_user_music_detail
+    GROUP BY user_id
+"""
+
+
+def file_signature(db_path):
+    """数据库及其 -wal 文件的修改时间与大小，只读取文件元数据，不会对数据库加锁"""
+    signature = []
+    for path in (db_path, f"{db_path}-wal"):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            signature.append(None)
+        else:
+            signature.append((stat.st_mtime_ns, stat.st_size))
+    return tuple(signature)
+
+
+def user_fingerprints(conn, user_ids):
+    """每个玩家成绩的汇总值，成绩变化时汇总值随之变化
+
+    查询结果一次取完，读事务立即结束，不会阻塞 Aqua 服务器写入。
+    """
+    rows = conn.execute(USER_FINGERPRINT_SQL).fetchall()
+    return {row[0]: row[1:] for row in rows if row[0] in user_ids}
+
+
+class DatabaseWatcher:
+    """轮询数据库文件的元数据，连续写入结束 debounce 秒后才视为一次变化"""
+
+    def __init__(
+        self, db_path, poll_interval=DEFAULT_POLL_INTERVAL, debounce=DEFAULT_DEBOUNCE
+    ):
+        self.db_path = db_path
+        self.poll_interval = poll_interval
+        self.debounce = debounce
+        self.signature = file_signature(db_path)
+
+    def wait_for_change(self, stop):
+        """阻塞直到数据库发生变化并稳定下来
+
+        Returns:
+            bool: 检测到变化时为 True，stop 被设置时为 False
+        """
+        while not stop.wait(self.poll_interval):
+            signature = file_signature(self.db_path)
+            if signature == self.signature:
+                continue
+
+            stable_for = 0.0
+            while stable_for < self.debounce:
+                if stop.wait(self.poll_interval):
+                    return False
+                current = file_signature(self.db_path)
+                if current == signature:
+                    stable_for += self.poll_interval
+                else:
+                    signature = current
+                    stable_for = 0.0
+            self.signature = signature
+            return True
+        return False
+
+
+def sync_user(config, user_id):
+    """上传单个玩家上次同步后变化的谱面，出错时只打印信息，不中断监视"""
+    try:
+        response = aquadx_data_upload(config, user_id=user_id)
+    except Exception as e:
+        print(f"user_id {user_id} 上传失败: {e}")
+        return
+    if response.get("message") == "更新成功":
+        print(f"user_id {user_id} 的新成绩已上传至 diving-fish")
+    elif response.get("status") != "unchanged":
+        print(f"user_id {user_id} 上传出现异常: {response.get('message')}")
+
+
+def watch(config, targets, poll_interval, debounce, stop=None):
+    """监视数据库直到 stop 被设置
+
+    Args:
+        config (dict): adm_config.json 中的配置
+        targets (dict): user_id 到该玩家上传时使用的配置（含 diving-fish 账号）
+        poll_interval (float): 检查数据库文件的间隔秒数
+        debounce (float): 最后一次写入后等待的秒数
+        stop (threading.Event, optional): 用于结束监视. Defaults to None.
+    """
+    stop = stop or threading.Event()
+    db_path = get_db_path(config)
+    conn = connect(db_path, config, read_only=True)
+    try:
+        fingerprints = user_fingerprints(conn, targets)
+        watcher = DatabaseWatcher(db_path, poll_interval, debounce)
+        print(f"正在监视 {db_path}，玩家: {', '.join(map(str, targets))}")
+
+        while watcher.wait_for_change(stop):
+            current = user_fingerprints(conn, targets)
+            changed = [
+                user_id
+                for user_id in targets
+                if current.get(user_id) != fingerprints.get(user_id)
+            ]
+            fingerprints = current
+            for user_id in changed:
+                sync_user(targets[user_id], user_id)
+    finally:
+        conn.close()
+        close_connections()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="游玩保存后自动上传成绩至 diving-fish")
+    parser.add_argument(
+        "--user-id", type=int, action="append", help="监视该玩家，可重复指定"
+    )
+    parser.add_argument("--jobs", help="批量同步的任务文件，使用其中的上传任务")
+    parser.add_argument("--interval", type=float, default=DEFAULT_POLL_INTERVAL)
+    parser.add_argument("--debounce", type=float, default=DEFAULT_DEBOUNCE)
+    args = parser.parse_args(argv)
+
+    config = load_config()
+    targets = {user_id: config for user_id in args.user_id or []}
+    if args.jobs:
+        for job in load_jobs(args.jobs):
+            if job["direction"] == UPLOAD:
+                targets[job["user_id"]] = dict(
+                    config, username=job["username"], password=job["password"]
+                )
+    if not targets:
+        parser.error("请通过 --user-id 或 --jobs 指定要监视的玩家")
+
+    try:
+        watch(config, targets, args.interval, args.debounce)
+    except KeyboardInterrupt:
+        print("已停止监视。")
+
+
+if __name__ == "__main__":
+    main()
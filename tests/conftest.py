@@ -0,0 +1,38 @@
+import pytest
+from src import aquadx_to_diving_fish, diving_fish_prober, prober_transport
+from src.aqua_db import close_connections
+from src.bench import mock_prober_server, synthetic_music_data, synthetic_records
+
+SONG_COUNT = 20
+
+
+@pytest.fixture
+def prober_server():
+    """本地 diving-fish 替身，见 src.bench.MockProberHandler"""
+    with mock_prober_server(
+        synthetic_records(10, SONG_COUNT), synthetic_music_data(SONG_COUNT)
+    ) as server:
+        yield server
+
+
+@pytest.fixture
+def config(tmp_path, monkeypatch, prober_server):
+    """在临时目录中运行，附属文件不会写入仓库；客户端、限速器与熔断器每个测试重新创建"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(diving_fish_prober, "_clients", {})
+    monkeypatch.setattr(aquadx_to_diving_fish, "_music_catalog", None)
+    monkeypatch.setattr(prober_transport, "_rate_limiter", None)
+    monkeypatch.setattr(prober_transport, "_circuit_breaker", None)
+    config = {
+        "username": "test",
+        "password": "test",
+        "aqua_path": str(tmp_path / "aqua"),
+        "upload_chunk_size": 2,
+        "upload_max_retries": 1,
+        "upload_retry_backoff": 0,
+        "network_retry_backoff": 0.01,
+        "prober_rate_limit": 0,
+    }
+    diving_fish_prober.get_client(config).base_url = prober_server.base_url
+    yield config
+    close_connections()
@@ -0,0 +1,46 @@
+import asyncio
+from src.async_prober import AsyncProberAPIClient, ProberConnectionPool
+from src.bench import synthetic_records
+from conftest import SONG_COUNT
+
+
+def run_with_client(config, base_url, func, accounts=1):
+    async def main():
+        async with ProberConnectionPool.from_config(config) as pool:
+            clients = []
+            for index in range(accounts):
+                client = AsyncProberAPIClient(pool, f"user{index}", "test")
+                client.base_url = base_url
+                clients.append(client)
+            return await func(*clients)
+
+    return asyncio.run(main())
+
+
+def test_iter_player_records_streams_all_records(config, prober_server):
+    async def collect(client):
+        meta = {}
+        records = [
+            record async for record in client.iter_player_records("test", "test", meta)
+        ]
+        return records, meta
+
+    records, meta = run_with_client(config, prober_server.base_url, collect)
+    assert records == synthetic_records(10, SONG_COUNT)
+    assert meta["username"] == "bench"
+
+
+def test_requests_go_through_transport(config, prober_server):
+    config["network_max_retries"] = 10
+    prober_server.fault_rate = 0.5
+
+    async def fetch(*clients):
+        await asyncio.gather(*(client.login() for client in clients))
+        return await asyncio.gather(
+            *(client.get_player_full_scores("", "") for client in clients),
+            clients[0].update_records("", "", [{"song_id": 1}]),
+        )
+
+    results = run_with_client(config, prober_server.base_url, fetch, accounts=3)
+    assert [len(result["records"]) for result in results[:3]] == [10] * 3
+    assert prober_server.injected_faults > 0
@@ -0,0 +1,57 @@
+import os
+import pytest
+from src.aquadx_to_diving_fish import upload_records
+from src.chunked_upload import UploadCheckpoint, upload_in_chunks
+from src.diving_fish_prober import get_client
+
+RECORDS = [{"song_id": song_id, "level_index": 0} for song_id in range(5)]
+# (music_id, level, achievement, combo_status, sync_status, deluxscore_max)
+AQUA_ROWS = [(song_id, 0, 1000000, 0, 0, 100) for song_id in range(5)]
+
+
+def test_failed_chunk_resumes_from_checkpoint(config, prober_server):
+    # 第 2 块的首次上传与重试都返回 500
+    prober_server.failing_uploads = {1, 2}
+    checkpoint = UploadCheckpoint.for_records(config, RECORDS)
+    with pytest.raises(RuntimeError):
+        upload_in_chunks(config, get_client(config), RECORDS, checkpoint)
+    assert checkpoint.confirmed_chunks == 1
+    assert prober_server.uploaded_chunks == [RECORDS[0:2]]
+
+    checkpoint = UploadCheckpoint.for_records(config, RECORDS)
+    assert checkpoint.confirmed_chunks == 1
+    upload_in_chunks(config, get_client(config), RECORDS, checkpoint)
+    assert prober_server.uploaded_chunks == [RECORDS[0:2], RECORDS[2:4], RECORDS[4:]]
+    assert not os.path.exists(checkpoint.path)
+
+
+def test_checkpoint_is_ignored_when_records_change(config, prober_server):
+    prober_server.failing_uploads = {1, 2}
+    checkpoint = UploadCheckpoint.for_records(config, RECORDS)
+    with pytest.raises(RuntimeError):
+        upload_in_chunks(config, get_client(config), RECORDS, checkpoint)
+
+    changed_records = RECORDS[:4]
+    assert UploadCheckpoint.for_records(config, changed_records).confirmed_chunks == 0
+
+
+def test_checkpoint_is_per_account(config, prober_server):
+    prober_server.failing_uploads = {1, 2}
+    checkpoint = UploadCheckpoint.for_records(config, RECORDS)
+    with pytest.raises(RuntimeError):
+        upload_in_chunks(config, get_client(config), RECORDS, checkpoint)
+
+    other_account = dict(config, username="other")
+    assert UploadCheckpoint.for_records(other_account, RECORDS).confirmed_chunks == 0
+
+
+def test_overwrite_skips_delete_on_resume(config, prober_server):
+    prober_server.failing_uploads = {1, 2}
+    with pytest.raises(RuntimeError):
+        upload_records(config, AQUA_ROWS, overwrite=True)
+    assert prober_server.delete_requests == 1
+
+    upload_records(config, AQUA_ROWS, overwrite=True)
+    # 续传时不能再清除已上传的第 1 块
+    assert prober_server.delete_requests == 1
+    assert [len(chunk) for chunk in prober_server.uploaded_chunks] == [2, 2, 1]
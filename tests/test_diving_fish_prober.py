@@ -0,0 +1,36 @@
+import json
+import pytest
+from src.diving_fish_prober import get_client
+from src.music_data_cache import load_music_data
+
+CACHED_MUSIC_DATA = [{"id": "1", "title": "cached"}]
+
+
+def test_truncated_records_raise_runtime_error(config, prober_server):
+    client = get_client(config)
+    client.login()
+    prober_server.truncate_bodies = True
+    records = client.iter_player_records(
+        config["username"], config["password"]
+    )
+    with pytest.raises(RuntimeError, match="读取响应失败"):
+        list(records)
+
+
+def test_truncated_music_data_falls_back_to_cache(config, prober_server, tmp_path):
+    cache_path = tmp_path / "music_data_cache.json"
+    cache_path.write_text(
+        json.dumps({"fetched_at": 0, "music_data": CACHED_MUSIC_DATA}),
+        encoding="utf-8",
+    )
+    prober_server.truncate_bodies = True
+    music_data = load_music_data(get_client(config), str(cache_path), ttl=0)
+    assert music_data == CACHED_MUSIC_DATA
+
+
+def test_music_data_is_cached(config, prober_server, tmp_path):
+    cache_path = str(tmp_path / "music_data_cache.json")
+    music_data = load_music_data(get_client(config), cache_path, ttl=0)
+    assert music_data == json.loads(prober_server.music_data)
+    # 未修改时服务器返回 304，仍使用缓存内容
+    assert load_music_data(get_client(config), cache_path, ttl=0) == music_data
@@ -0,0 +1,46 @@
+import json
+import pytest
+from src.json_stream import iter_json_array, iter_json_object_array
+
+PAYLOAD = {
+    "username": "玩家",
+    "rating": 12345,
+    "records": [
+        {"title": "曲名 ☆", "achievements": 100.5, "dxScore": 2000, "fc": "app"},
+        {"title": "", "achievements": 1e2, "dxScore": -1, "fc": None},
+        [1, 2.25, True, False, None, '\\"é'],
+    ],
+    "plate": {"nested": [1, {"a": "b"}]},
+}
+
+
+def split_bytes(data, size):
+    return [data[start : start + size] for start in range(0, len(data), size)]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 5, 7, 64])
+def test_object_array_across_chunk_boundaries(chunk_size):
+    data = json.dumps(PAYLOAD, ensure_ascii=False, indent=1).encode("utf-8")
+    meta = {}
+    records = list(
+        iter_json_object_array(split_bytes(data, chunk_size), "records", meta)
+    )
+    assert records == PAYLOAD["records"]
+    assert meta == {key: value for key, value in PAYLOAD.items() if key != "records"}
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 4])
+def test_number_split_at_chunk_boundary(chunk_size):
+    values = [123456789, 0.000125, -42, 7]
+    data = json.dumps(values, separators=(",", ":")).encode("utf-8")
+    assert list(iter_json_array(split_bytes(data, chunk_size))) == values
+
+
+def test_empty_array():
+    assert list(iter_json_array([b" [ ", b" ] "])) == []
+
+
+def test_truncated_response_raises():
+    data = json.dumps(PAYLOAD).encode("utf-8")[:-20]
+    with pytest.raises(ValueError):
+        list(iter_json_object_array(split_bytes(data, 16), "records"))
@@ -0,0 +1,103 @@
+import time
+import pytest
+import requests
+from requests.exceptions import ChunkedEncodingError
+from src.chunked_upload import UploadCheckpoint, upload_in_chunks
+from src.diving_fish_prober import get_client
+from src.prober_transport import (
+    CircuitBreaker,
+    CircuitOpenError,
+    ProberTransport,
+    TokenBucket,
+)
+
+
+class FlakySession(requests.Session):
+    """先依次抛出 errors 中的异常，之后正常发送请求"""
+
+    def __init__(self, errors):
+        super().__init__()
+        self.errors = list(errors)
+
+    def request(self, *args, **kwargs):
+        if self.errors:
+            raise self.errors.pop(0)
+        return super().request(*args, **kwargs)
+
+
+def make_transport(session, breaker, max_retries=0):
+    return ProberTransport(session, 5, max_retries, 0.01, TokenBucket(0), breaker)
+
+
+def test_retries_until_server_recovers(prober_server):
+    prober_server.fault_rate = 0.5
+    transport = make_transport(requests.Session(), CircuitBreaker(100, 1), 10)
+    for _ in range(10):
+        response = transport.request("GET", f"{prober_server.base_url}/music_data")
+        assert response.status_code == 200
+    assert prober_server.injected_faults > 0
+
+
+def test_breaker_opens_and_closes_again(prober_server):
+    url = f"{prober_server.base_url}/music_data"
+    breaker = CircuitBreaker(2, 0.2)
+    transport = make_transport(requests.Session(), breaker)
+
+    prober_server.fault_rate = 1.0
+    assert transport.request("GET", url).status_code == 503
+    assert transport.request("GET", url).status_code == 503
+    with pytest.raises(CircuitOpenError):
+        transport.request("GET", url)
+
+    prober_server.fault_rate = 0.0
+    time.sleep(0.25)
+    assert transport.request("GET", url).status_code == 200
+    assert breaker.opened_at is None
+    assert transport.request("GET", url).status_code == 200
+
+
+def test_failed_probe_with_unexpected_error_reopens_breaker(prober_server):
+    url = f"{prober_server.base_url}/music_data"
+    breaker = CircuitBreaker(2, 0.2)
+    session = FlakySession(
+        [
+            requests.ConnectionError(),
+            requests.ConnectionError(),
+            ChunkedEncodingError(),
+        ]
+    )
+    transport = make_transport(session, breaker)
+
+    for _ in range(2):
+        with pytest.raises(requests.ConnectionError):
+            transport.request("GET", url)
+    time.sleep(0.25)
+    # 半开状态的试探请求抛出其他异常，熔断器应重新计时而不是一直拒绝
+    with pytest.raises(ChunkedEncodingError):
+        transport.request("GET", url)
+    with pytest.raises(CircuitOpenError):
+        transport.request("GET", url)
+
+    time.sleep(0.25)
+    assert transport.request("GET", url).status_code == 200
+    assert breaker.opened_at is None
+
+
+def test_chunked_upload_stops_when_breaker_opens(config, prober_server, monkeypatch):
+    config["upload_max_retries"] = 5
+    prober_server.fault_rate = 1.0
+    client = get_client(config)
+    calls = []
+    update_records = client.update_records
+
+    def counting_update_records(**kwargs):
+        calls.append(kwargs)
+        return update_records(**kwargs)
+
+    monkeypatch.setattr(client, "update_records", counting_update_records)
+    records = [{"song_id": 0, "level_index": 0}]
+    checkpoint = UploadCheckpoint.for_records(config, records)
+    with pytest.raises(CircuitOpenError):
+        upload_in_chunks(config, client, records, checkpoint)
+    # 第一次调用重试 4 次后失败，第二次调用时熔断器已打开
+    assert len(calls) == 2
@@ -0,0 +1,48 @@
+import sqlite3
+from src.bench import build_synthetic_db, synthetic_music_data
+from src.music_catalog import MusicCatalog
+from src.rating import B15_SIZE, B35_SIZE, chart_rating, compute_ratings
+from conftest import SONG_COUNT
+
+
+def reference_ratings(conn, music_catalog):
+    """逐条用 chart_rating 计算，作为 SQL 结果的对照"""
+    charts = {}
+    for user_id, music_id, level, achievement in conn.execute(
+        "SELECT user_id, music_id, level, achievement FROM maimai2_user_music_detail"
+    ):
+        music = music_catalog.get_by_id(music_id)
+        if music is None or level >= len(music["ds"]):
+            continue
+        is_new = bool(music.get("basic_info", {}).get("is_new"))
+        rating = chart_rating(music["ds"][level], achievement)
+        charts.setdefault(user_id, {}).setdefault(is_new, []).append(rating)
+
+    ratings = {}
+    for user_id, by_version in charts.items():
+        b35 = sum(sorted(by_version.get(False, []), reverse=True)[:B35_SIZE])
+        b15 = sum(sorted(by_version.get(True, []), reverse=True)[:B15_SIZE])
+        ratings[user_id] = {"rating": b35 + b15, "b35": b35, "b15": b15}
+    return ratings
+
+
+def test_compute_ratings_matches_reference(tmp_path):
+    music_data = synthetic_music_data(SONG_COUNT)
+    for music in music_data[::3]:
+        music["basic_info"] = {"is_new": True}
+    music_catalog = MusicCatalog(music_data)
+    db_path = str(tmp_path / "db.sqlite")
+    build_synthetic_db(db_path, SONG_COUNT * 5, 3, SONG_COUNT)
+
+    conn = sqlite3.connect(db_path)
+    expected = reference_ratings(conn, music_catalog)
+    assert compute_ratings(conn, music_catalog) == expected
+    assert compute_ratings(conn, music_catalog, user_id=2) == {2: expected[2]}
+    conn.close()
+
+
+def test_chart_rating_thresholds():
+    assert chart_rating(14.0, 1005000) == int(14.0 * 1.005 * 22.4)
+    assert chart_rating(14.0, 1004999) == int(14.0 * 1.004999 * 21.6)
+    assert chart_rating(14.0, 1010000) == chart_rating(14.0, 1005000)
+    assert chart_rating(14.0, 99999) == 0
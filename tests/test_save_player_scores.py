@@ -0,0 +1,53 @@
+import os
+import sqlite3
+from src.bench import build_synthetic_db, synthetic_records
+from src.diving_fish_to_aquadx import save_player_scores
+from src.init_config import get_db_path
+from conftest import SONG_COUNT
+
+
+def create_db(config):
+    db_path = get_db_path(config)
+    os.makedirs(os.path.dirname(db_path))
+    build_synthetic_db(db_path, SONG_COUNT * 5, 1, SONG_COUNT)
+    return db_path
+
+
+def test_download_does_not_hold_write_lock_while_streaming(config):
+    db_path = create_db(config)
+    records = synthetic_records(SONG_COUNT * 5, SONG_COUNT)
+
+    def slow_records():
+        for index, record in enumerate(records):
+            if index == len(records) // 2:
+                # 模拟下载途中 Aqua 服务器保存数据
+                other = sqlite3.connect(db_path, timeout=0.2)
+                with other:
+                    other.execute("UPDATE maimai2_user_detail SET player_rating = 1")
+                other.close()
+            yield record
+
+    stats = save_player_scores(config, {"records": slow_records()}, 1, overwrite=True)
+    assert stats["inserted"] == len(records)
+
+
+def test_merge_keeps_best_scores(config):
+    db_path = create_db(config)
+    conn = sqlite3.connect(db_path)
+    before = dict(
+        conn.execute(
+            "SELECT music_id * 10 + level, achievement FROM maimai2_user_music_detail "
+            "WHERE user_id = 1"
+        )
+    )
+    records = synthetic_records(SONG_COUNT * 5, SONG_COUNT)
+    save_player_scores(config, {"records": iter(records)}, 1, incremental=False)
+    after = dict(
+        conn.execute(
+            "SELECT music_id * 10 + level, achievement FROM maimai2_user_music_detail "
+            "WHERE user_id = 1"
+        )
+    )
+    conn.close()
+    assert set(after) >= set(before)
+    assert all(after[key] >= achievement for key, achievement in before.items())
@@ -0,0 +1,60 @@
+import sqlite3
+from src.bench import build_synthetic_db
+from src.score_export import ScoreImporter, export_tables, read_exported_rows
+from conftest import SONG_COUNT
+
+
+def make_db(path, users):
+    build_synthetic_db(str(path), SONG_COUNT, users, SONG_COUNT)
+    conn = sqlite3.connect(str(path))
+    conn.execute(
+        "CREATE UNIQUE INDEX user_name_unique ON maimai2_user_detail(user_name)"
+    )
+    return conn
+
+
+def count_scores(conn, user_id):
+    return conn.execute(
+        "SELECT COUNT(*) FROM maimai2_user_music_detail WHERE user_id = ?", (user_id,)
+    ).fetchone()[0]
+
+
+def test_round_trip_into_new_user(tmp_path):
+    source = make_db(tmp_path / "source.sqlite", 1)
+    export_path = str(tmp_path / "scores.ndjson")
+    export_tables(source, export_path)
+
+    target = make_db(tmp_path / "target.sqlite", 0)
+    stats = ScoreImporter(target).run(read_exported_rows(export_path))
+    assert stats["users"] == 1
+    assert stats["inserted"] == count_scores(source, 1) == count_scores(target, 1)
+
+
+def test_conflicting_user_is_reported_and_skipped(tmp_path):
+    source = make_db(tmp_path / "source.sqlite", 1)
+    export_path = str(tmp_path / "scores.ndjson")
+    export_tables(source, export_path)
+
+    # 目标库中 user1 这个名字已被 id 为 5 的玩家占用
+    target = make_db(tmp_path / "target.sqlite", 0)
+    with target:
+        target.execute("INSERT INTO maimai2_user_detail VALUES (5, 'user1', 0)")
+    importer = ScoreImporter(target)
+    stats = importer.run(read_exported_rows(export_path))
+    assert importer.skipped_users == {1}
+    assert stats["users"] == 0
+    assert stats["skipped"] == count_scores(source, 1)
+    assert count_scores(target, 1) == 0
+
+
+def test_existing_user_keeps_scores_merged(tmp_path):
+    source = make_db(tmp_path / "source.sqlite", 1)
+    export_path = str(tmp_path / "scores.ndjson")
+    export_tables(source, export_path)
+
+    target = make_db(tmp_path / "target.sqlite", 1)
+    importer = ScoreImporter(target)
+    stats = importer.run(read_exported_rows(export_path))
+    assert not importer.skipped_users
+    assert stats["users"] == 0
+    assert stats["unchanged"] == count_scores(source, 1)
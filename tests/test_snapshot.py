@@ -0,0 +1,44 @@
+import os
+import sqlite3
+from src.bench import build_synthetic_db
+from src.init_config import get_db_path
+from src.snapshot import list_snapshots, load_snapshot, read_manifest, save_snapshot
+from conftest import SONG_COUNT
+
+
+def create_db(config):
+    db_path = get_db_path(config)
+    os.makedirs(os.path.dirname(db_path))
+    build_synthetic_db(db_path, SONG_COUNT * 5, 1, SONG_COUNT)
+    return db_path
+
+
+def rename_user(db_path, user_name):
+    conn = sqlite3.connect(db_path)
+    with conn:
+        conn.execute("UPDATE maimai2_user_detail SET user_name = ?", (user_name,))
+    conn.close()
+
+
+def test_replaced_snapshot_is_read_again(config):
+    db_path = create_db(config)
+    save_snapshot(config, "save1.sqlite")
+    rename_user(db_path, "renamed")
+    save_snapshot(config, "save2.sqlite")
+
+    # 大小相同的另一个存档覆盖 save1，清单中的条目已过时
+    assert os.path.getsize("save1.sqlite") == os.path.getsize("save2.sqlite")
+    os.replace("save2.sqlite", "save1.sqlite")
+
+    ((file_name, users),) = list_snapshots()
+    assert file_name == "save1.sqlite"
+    assert users[0]["user_name"] == "renamed"
+    assert "save1.sqlite" not in read_manifest()
+
+    rename_user(db_path, "current")
+    load_snapshot(config, "save1.sqlite")
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("SELECT user_name FROM maimai2_user_detail").fetchone() == (
+        "renamed",
+    )
+    conn.close()